@@ -0,0 +1,172 @@
+"""Checks that the reports of a history don't depend on how it's enriched or aggregated, against the local stand-in of the TMDB API
+(check fake_tmdb.py) and a synthetic history (check generate_history.py).
+
+First, a single run, --batch and --catalog must print exactly the same reports for the same file, both with the cast of each episode
+and with --season-cast. Each way runs year_in_review.py on its own directory, so none of them reuses the cache of another one. Then the
+enriched rows are aggregated in every other way (the columnar store, a process pool, with progress snapshots, the AggregateCube and
+the TemporalIndex), and their reports must be exactly the same as the ones of a single Aggregates object. The ranges of the cube and
+the index are also checked with the rows shuffled, as in a file that isn't in chronological order.
+
+Usage: python3 benchmarks/check_consistency.py [--rows 1k] [--titles 60] [--seed 0]
+It prints the ways whose reports differ, and exits with status 1 if there's any of them.
+"""
+import argparse
+import contextlib
+import difflib
+import io
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(BENCHMARKS_DIR, "..", "year_in_review.py")
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, ".."))
+sys.path.insert(0, BENCHMARKS_DIR)
+import year_in_review
+from generate_history import parse_amount, write_history
+from run_benchmark import enrich, start_fake_api
+
+USER = "history"
+# Options of the runs of each way of enriching the history
+RUN_OPTIONS = ((), ("--season-cast",))
+# Printed by a single run after the reports of the rows that failed. It isn't part of the reports, so it's left out of the comparison
+DEAD_LETTERS_NOTICE = "they can be retried with --retry-dead-letters"
+
+def run_script(work_dir, base_url, *args):
+    """Runs year_in_review.py on a directory, so its cache and journal are kept there.
+    Params:
+        work_dir: String. The working directory of the script.
+        base_url: String. The base URL of the API.
+        args: strings. The arguments of the script.
+    Returns a string with what the script printed, without the dead letters notice.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    command = [sys.executable, SCRIPT, "--base-url", base_url] + list(args)
+    output = subprocess.run(command, cwd=work_dir, stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+    return "".join(line for line in output.splitlines(True) if DEAD_LETTERS_NOTICE not in line)
+
+def get_single_run(work_dir, base_url, file_name, options):
+    """Returns a string with the reports of the history enriched by a single run, with the given options of the script."""
+    return run_script(work_dir, base_url, file_name, *options)
+
+def get_batch(work_dir, base_url, file_name, options):
+    """Returns a string with the reports of the history enriched with --batch, as the only user of the batch."""
+    os.makedirs(os.path.join(work_dir, "users"))
+    shutil.copy(file_name, os.path.join(work_dir, "users", USER + ".tsv"))
+    run_script(work_dir, base_url, "--batch", "users", "--reports-dir", "reports", *options)
+    with open(os.path.join(work_dir, "reports", USER + ".txt")) as f:
+        return f.read()
+
+def get_catalog(work_dir, base_url, file_name, options):
+    """Returns a string with the reports of the history built offline with --catalog."""
+    run_script(work_dir, base_url, "--build-catalog", "catalog.bin", file_name, *options)
+    return run_script(work_dir, base_url, "--catalog", "catalog.bin", file_name, *options)
+
+CHECKS = {
+    "--batch": get_batch,
+    "--catalog": get_catalog,
+}
+
+def format_reports(aggregates):
+    """Returns a string with every one of the REPORTS of the aggregates."""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        year_in_review.print_reports(aggregates, list(year_in_review.REPORTS))
+    return output.getvalue()
+
+def get_middle_period(watched_content):
+    """Returns a tuple with the first and last days of the middle third of the history, as datetime objects."""
+    first_day = min(watched.date for watched in watched_content)
+    span = max(watched.date for watched in watched_content) - first_day
+    return first_day + timedelta(days=span.days // 3), first_day + timedelta(days=span.days * 2 // 3)
+
+def get_month(date):
+    """Returns the month of the date as a YYYY-MM string, as the AggregateCube does."""
+    return "{:04d}-{:02d}".format(date.year, date.month)
+
+def get_aggregations(watched_content):
+    """Params:
+        watched_content: a list of WatchedContent objects.
+    Returns a list of (name, expected, reports) tuples, where expected are the reports of a single Aggregates object and reports are the
+    ones of another way of aggregating the same rows.
+    """
+    serial = format_reports(year_in_review.build_aggregates(watched_content))
+    # Several chunks, so their merge is checked too
+    chunk_size = max(1, len(watched_content) // 7)
+    aggregations = [
+        ("--processes", serial, format_reports(year_in_review.aggregate_in_processes(watched_content, processes=2, chunk_size=chunk_size))),
+        ("--progress", serial, format_reports(year_in_review.aggregate_with_progress(year_in_review.build_aggregates(()), watched_content, 0.001,
+                                                                                     file=io.StringIO()))),
+        ("AggregateCube", serial, format_reports(year_in_review.AggregateCube(watched_content).query())),
+        ("TemporalIndex", serial, format_reports(year_in_review.TemporalIndex(watched_content).query())),
+    ]
+    if year_in_review.np is not None:
+        aggregations.append(("--columnar", serial, format_reports(year_in_review.build_aggregates(watched_content, columnar=True))))
+    else:
+        print("NumPy isn't installed, so --columnar isn't checked")
+    start, end = get_middle_period(watched_content)
+    shuffled = list(watched_content)
+    random.Random(0).shuffle(shuffled)
+    for name, rows in (("chronological", watched_content), ("shuffled", shuffled)):
+        in_months = [watched for watched in rows if get_month(start) <= get_month(watched.date) <= get_month(end)]
+        aggregations.append(("AggregateCube of {} to {}, {}".format(get_month(start), get_month(end), name),
+                             format_reports(year_in_review.build_aggregates(in_months)),
+                             format_reports(year_in_review.AggregateCube(rows).query(get_month(start), get_month(end)))))
+        aggregations.append(("TemporalIndex of {:%Y-%m-%d} to {:%Y-%m-%d}, {}".format(start, end, name),
+                             format_reports(year_in_review.build_aggregates(year_in_review.filter_by_date(rows, start, end))),
+                             format_reports(year_in_review.TemporalIndex(rows).query(start, end))))
+    return aggregations
+
+def compare(name, expected, reports, reference):
+    """Params:
+        name: String. The way the reports were built.
+        expected: String. The reports that the way has to print.
+        reports: String. The reports that the way printed.
+        reference: String. The way the expected reports were built.
+    Returns True if the reports are the same. Otherwise, prints their differences and returns False.
+    """
+    if reports == expected:
+        print("{}: same reports as {}".format(name, reference))
+        return True
+    print("{} differs from {}".format(name, reference))
+    sys.stdout.writelines(difflib.unified_diff(expected.splitlines(True), reports.splitlines(True), reference, name, n=1))
+    return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks that the reports don't depend on how the history is enriched or aggregated")
+    parser.add_argument("--rows", type=parse_amount, default=parse_amount("1k"), help="Rows of the synthetic file, i.e. 1k or 100k (default: 1k)")
+    parser.add_argument("--titles", type=int, default=60, help="Different movies and shows of the synthetic file (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    work_dir = tempfile.mkdtemp(prefix="year_in_review_consistency_")
+    file_name = os.path.join(work_dir, "history.tsv")
+    write_history(file_name, args.rows, args.titles, args.seed)
+    server, base_url = start_fake_api(0, 0, 0, 0)
+    different = []
+    try:
+        for options in RUN_OPTIONS:
+            suffix = "".join(options)
+            expected = get_single_run(os.path.join(work_dir, "single" + suffix), base_url, file_name, options)
+            for name, get_reports in CHECKS.items():
+                name = " ".join((name,) + options)
+                reports = get_reports(os.path.join(work_dir, name.replace(" ", "")), base_url, file_name, options)
+                if not compare(name, expected, reports, " ".join(("the single run",) + options)):
+                    different.append(name)
+        # The rows are enriched again with the cache of the single run, so no request is done
+        cache_file = os.path.join(work_dir, "single", year_in_review.CACHE_FILE)
+        watched_content, elapsed = enrich(file_name, cache_file, base_url, year_in_review.MAX_WORKERS, year_in_review.RATE_LIMIT_PER_SECOND,
+                                          year_in_review.CONTENT_FIELDS)
+        for name, expected, reports in get_aggregations(watched_content):
+            if not compare(name, expected, reports, "a single Aggregates object"):
+                different.append(name)
+    finally:
+        server.kill()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    sys.exit(1 if different else 0)
+
+if __name__ == "__main__":
+    main()
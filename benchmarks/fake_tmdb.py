@@ -0,0 +1,316 @@
+"""Local stand-in of the TMDB API, used to benchmark the script without doing any request to the real API.
+
+It serves the /find, /movie, /tv, season, episode and changes endpoints used by year_in_review.py. The content is made up out of the IDs,
+so the same ID always gets the same response and no data has to be loaded. The IMDB IDs follow the scheme of movie_imdb_id and
+episode_imdb_id, which is also used by generate_history.py. The latency, the error rate and the rate of 429 responses can be set
+to see how the script behaves with a slow or unreliable API.
+
+The amount of requests served by endpoint and status code is available at /__stats.
+
+Usage: python3 benchmarks/fake_tmdb.py [--port 8000] [--latency 0.05] [--error-rate 0.01] [--rate-limited-rate 0.01]
+Then run the script with --base-url http://127.0.0.1:8000/3 (or the TMDB_BASE_URL environment variable).
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# The episodes of a show are numbered with these many seasons per show and episodes per season
+SEASONS_PER_SHOW = 10
+EPISODES_PER_SEASON = 30
+# One of every NOT_FOUND_EVERY IMDB IDs isn't in the fake database, so the "not found" path is also exercised
+NOT_FOUND_EVERY = 97
+GENRES = 20
+ACTORS = 50000
+DIRECTORS = 5000
+COMPANIES = 3000
+CAST_SIZE = 30
+CREW_SIZE = 10
+# Movies and shows that change each day, out of the first CHANGED_IDS of each, and the results of each page of the changes
+CHANGES_PER_DAY = 100
+CHANGED_IDS = 20000
+CHANGES_PAGE_SIZE = 100
+# As with TMDB, the changes of up to 14 days can be asked at once
+MAX_CHANGES_DAYS = 14
+
+def movie_imdb_id(movie):
+    """Params:
+        movie: Int. The number of the movie.
+    Returns a string with the IMDB ID of the movie. Movies have even IDs.
+    """
+    return "tt{:07d}".format(2 * movie)
+
+def episode_imdb_id(show, season, episode):
+    """Params:
+        show: Int. The number of the show.
+        season: Int. The season number, from 1 to SEASONS_PER_SHOW.
+        episode: Int. The episode number, from 1 to EPISODES_PER_SEASON.
+    Returns a string with the IMDB ID of the episode. Episodes have odd IDs.
+    """
+    return "tt{:07d}".format(2 * ((show * SEASONS_PER_SHOW + season - 1) * EPISODES_PER_SEASON + episode - 1) + 1)
+
+def parse_imdb_id(imdb_id):
+    """Params:
+        imdb_id: String. An IMDB ID, as built by movie_imdb_id or episode_imdb_id.
+    Returns either a ("movie", movie) or an ("episode", show, season, episode) tuple, or None if the ID isn't in the fake database.
+    """
+    number = int(imdb_id[2:])
+    if number % NOT_FOUND_EVERY == NOT_FOUND_EVERY - 1:
+        return None
+    if number % 2 == 0:
+        return ("movie", number // 2)
+    number //= 2
+    episode = number % EPISODES_PER_SEASON + 1
+    number //= EPISODES_PER_SEASON
+    return ("episode", number // SEASONS_PER_SHOW, number % SEASONS_PER_SHOW + 1, episode)
+
+def get_people(rnd, prefix, amount, size):
+    """Params:
+        rnd: Random object.
+        prefix: String. The prefix of the names.
+        amount: Int. The amount of people to pick.
+        size: Int. The amount of different people. A few of them are picked much more often than the rest, like popular actors.
+    Returns a list of names.
+    """
+    return ["{} {}".format(prefix, int(rnd.paretovariate(1.2)) % size) for _ in range(amount)]
+
+def get_credits(rnd):
+    """Params:
+        rnd: Random object.
+    Returns a dictionary with the cast and crew, as in the credits appended to the responses.
+    """
+    cast = [{"name": name, "character": "Character"} for name in get_people(rnd, "Actor", CAST_SIZE, ACTORS)]
+    crew = [{"name": name, "job": "Writer"} for name in get_people(rnd, "Writer", CREW_SIZE - 2, DIRECTORS)]
+    crew.insert(rnd.randrange(len(crew)), {"name": get_people(rnd, "Director", 1, DIRECTORS)[0], "job": "Director"})
+    crew.append({"name": get_people(rnd, "Director", 1, DIRECTORS)[0], "job": "Director"})
+    return {"cast": cast, "crew": crew}
+
+def get_names(rnd, prefix, size):
+    """Returns a list of 1 to 3 {"id": ..., "name": ...} dictionaries, as the genres and production companies."""
+    return [{"id": value, "name": "{} {}".format(prefix, value)} for value in rnd.sample(range(size), rnd.randint(1, 3))]
+
+def get_movie(movie, credits):
+    """Params:
+        movie: Int. The number of the movie.
+        credits: Boolean. Whether to append the credits.
+    Returns a dictionary with the movie details.
+    """
+    rnd = random.Random(movie)
+    body = {
+        "id": movie,
+        "original_title": "Movie {}".format(movie),
+        "overview": "Overview of the movie. " * 10,
+        "genres": get_names(rnd, "Genre", GENRES),
+        "production_companies": get_names(rnd, "Company", COMPANIES),
+        "release_date": "{}-{:02d}-{:02d}".format(rnd.randint(1950, 2020), rnd.randint(1, 12), rnd.randint(1, 28)),
+        "runtime": rnd.randint(70, 180),
+    }
+    if credits:
+        body["credits"] = get_credits(rnd)
+    return body
+
+def get_show(show):
+    """Params:
+        show: Int. The number of the show.
+    Returns a dictionary with the show details.
+    """
+    rnd = random.Random(-show - 1)
+    return {
+        "id": show,
+        "original_name": "Show {}".format(show),
+        "overview": "Overview of the show. " * 10,
+        "genres": get_names(rnd, "Genre", GENRES),
+        "production_companies": get_names(rnd, "Company", COMPANIES),
+        "episode_run_time": [rnd.choice((22, 30, 45, 60))],
+        "number_of_seasons": SEASONS_PER_SHOW,
+    }
+
+def get_episode(show, season, episode, credits):
+    """Params:
+        show, season and episode: Int. Check episode_imdb_id.
+        credits: Boolean. Whether to append the credits.
+    Returns a dictionary with the episode details.
+    """
+    rnd = random.Random((show * SEASONS_PER_SHOW + season) * EPISODES_PER_SEASON + episode)
+    episode_credits = get_credits(rnd)
+    body = {
+        "id": (show * SEASONS_PER_SHOW + season) * EPISODES_PER_SEASON + episode,
+        "name": "Episode {}".format(episode),
+        "air_date": "{}-{:02d}-{:02d}".format(2000 + show % 20, (season - 1) % 12 + 1, min(episode, 28)),
+        "season_number": season,
+        "episode_number": episode,
+        "crew": episode_credits["crew"],
+    }
+    if credits:
+        body["credits"] = episode_credits
+    return body
+
+def get_season(show, season, credits):
+    """Params:
+        show and season: Int. Check episode_imdb_id.
+        credits: Boolean. Whether to append the credits of the season.
+    Returns a dictionary with the season details, with all its episodes.
+    """
+    body = {
+        "season_number": season,
+        "episodes": [get_episode(show, season, episode, False) for episode in range(1, EPISODES_PER_SEASON + 1)],
+    }
+    if credits:
+        body["credits"] = get_credits(random.Random(-(show * SEASONS_PER_SHOW + season) - 1))
+    return body
+
+def get_changes(kind, start_date, end_date, page):
+    """Params:
+        kind: String. "movie" or "tv".
+        start_date and end_date: datetime objects. The first and the last day.
+        page: Int. The page of the results, from 1.
+    Returns a dictionary with a page of the IDs that changed between the dates, or None if they are more than MAX_CHANGES_DAYS apart.
+    The same day always has the same changes.
+    """
+    if end_date < start_date or (end_date - start_date).days >= MAX_CHANGES_DAYS:
+        return None
+    ids = set()
+    day = start_date
+    while day <= end_date:
+        ids.update(random.Random("{} {}".format(kind, day.strftime("%Y-%m-%d"))).sample(range(CHANGED_IDS), CHANGES_PER_DAY))
+        day += timedelta(days=1)
+    ids = sorted(ids)
+    return {
+        "results": [{"id": content_id, "adult": False} for content_id in ids[(page - 1) * CHANGES_PAGE_SIZE:page * CHANGES_PAGE_SIZE]],
+        "page": page,
+        "total_pages": max(1, (len(ids) + CHANGES_PAGE_SIZE - 1) // CHANGES_PAGE_SIZE),
+        "total_results": len(ids),
+    }
+
+class FakeTMDBHandler(BaseHTTPRequestHandler):
+    # Keep-alive connections, so the connection pool of the script is used as with the real API
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/__stats":
+            with self.server.stats_lock:
+                self._send(200, dict(self.server.stats))
+            return
+        params = parse_qs(url.query)
+        kind, body = self._route(url.path, params)
+        if self.server.latency > 0:
+            time.sleep(random.uniform(0.5, 1.5) * self.server.latency)
+        status = 200 if body is not None else 404
+        headers = {}
+        failure = random.random()
+        if failure < self.server.rate_limited_rate:
+            status = 429
+            headers["Retry-After"] = str(self.server.retry_after)
+            body = {"status_code": 25, "status_message": "Your request count is over the allowed limit."}
+        elif failure < self.server.rate_limited_rate + self.server.error_rate:
+            status = 503
+            body = {"status_code": 9, "status_message": "Service offline."}
+        elif body is None:
+            body = {"status_code": 34, "status_message": "The resource you requested could not be found."}
+        with self.server.stats_lock:
+            key = "{} {}".format(kind, status)
+            self.server.stats[key] = self.server.stats.get(key, 0) + 1
+        self._send(status, body, headers)
+
+    def _route(self, path, params):
+        """Private auxiliary method.
+        Params:
+            path: String. The path of the request.
+            params: Dictionary. The query parameters, as returned by parse_qs.
+        Returns a tuple with the kind of endpoint and the body of the response, or None if there's no such content.
+        """
+        credits = "credits" in params.get("append_to_response", [""])[0].split(",")
+        match = re.match(r"^/3/(movie|tv)/changes$", path)
+        if match:
+            # By default, the changes of the last day, as with TMDB
+            today = datetime.utcnow().strftime("%Y-%m-%d")
+            end_date = datetime.strptime(params.get("end_date", [today])[0], "%Y-%m-%d")
+            start_date = datetime.strptime(params["start_date"][0], "%Y-%m-%d") if "start_date" in params else end_date - timedelta(days=1)
+            return "changes", get_changes(match.group(1), start_date, end_date, int(params.get("page", ["1"])[0]))
+        match = re.match(r"^/3/find/(tt\d+)$", path)
+        if match:
+            content = parse_imdb_id(match.group(1))
+            body = {"movie_results": [], "person_results": [], "tv_results": [], "tv_episode_results": [], "tv_season_results": []}
+            if content is not None and content[0] == "movie":
+                body["movie_results"].append({"id": content[1], "original_title": "Movie {}".format(content[1])})
+            elif content is not None:
+                show, season, episode = content[1:]
+                body["tv_episode_results"].append({"id": (show * SEASONS_PER_SHOW + season) * EPISODES_PER_SEASON + episode,
+                                                   "show_id": show, "season_number": season, "episode_number": episode})
+            return "find", body
+        match = re.match(r"^/3/movie/(\d+)$", path)
+        if match:
+            return "movie", get_movie(int(match.group(1)), credits)
+        match = re.match(r"^/3/tv/(\d+)$", path)
+        if match:
+            return "tv", get_show(int(match.group(1)))
+        match = re.match(r"^/3/tv/(\d+)/season/(\d+)$", path)
+        if match and 1 <= int(match.group(2)) <= SEASONS_PER_SHOW:
+            return "season", get_season(int(match.group(1)), int(match.group(2)), credits)
+        match = re.match(r"^/3/tv/(\d+)/season/(\d+)/episode/(\d+)$", path)
+        if match and 1 <= int(match.group(2)) <= SEASONS_PER_SHOW and 1 <= int(match.group(3)) <= EPISODES_PER_SEASON:
+            return "episode", get_episode(int(match.group(1)), int(match.group(2)), int(match.group(3)), credits)
+        return "unknown", None
+
+    def _send(self, status, body, headers=None):
+        """Private auxiliary method that sends a JSON response."""
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+def start_server(port=0, latency=0, error_rate=0, rate_limited_rate=0, retry_after=1):
+    """Starts the fake API on a background thread.
+    Params:
+        port: Int. The port to listen to. By default, any free port.
+        latency: Number. The average amount of seconds that each response takes.
+        error_rate: Number. The share of the requests that fail with a 503 status code.
+        rate_limited_rate: Number. The share of the requests that are rejected with a 429 status code.
+        retry_after: Number. The seconds sent in the Retry-After header of the 429 responses.
+    Returns a tuple with the server object and the base URL of the API.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeTMDBHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.rate_limited_rate = rate_limited_rate
+    server.retry_after = retry_after
+    server.stats = {}
+    server.stats_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{}/3".format(server.server_address[1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in of the TMDB API")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen to, 0 for any free port (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=0, help="Average seconds per response (default: %(default)s)")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of the requests that fail with a 503 (default: %(default)s)")
+    parser.add_argument("--rate-limited-rate", type=float, default=0, help="Share of the requests rejected with a 429 (default: %(default)s)")
+    parser.add_argument("--retry-after", type=float, default=1, help="Seconds of the Retry-After header of the 429s (default: %(default)s)")
+    args = parser.parse_args()
+    server, base_url = start_server(args.port, args.latency, args.error_rate, args.rate_limited_rate, args.retry_after)
+    # The first line is read by run_benchmark.py to know where the server is
+    print("Serving on {}".format(base_url))
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
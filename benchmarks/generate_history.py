@@ -0,0 +1,95 @@
+"""Generates a synthetic watching habits file, with the same columns as the real one and IMDB IDs known by fake_tmdb.py.
+
+Series are watched in binges of consecutive episodes, and a few popular titles are watched much more often than the rest, so the
+amount of unique titles and seasons is close to a real history.
+
+Usage: python3 benchmarks/generate_history.py --rows 100k [--output history_100k.tsv] [--titles 5000] [--seed 0]
+The amount of rows accepts the k and M suffixes, i.e. 1k, 100k or 1M.
+"""
+import argparse
+import csv
+import random
+from datetime import datetime, timedelta
+
+from fake_tmdb import EPISODES_PER_SEASON, SEASONS_PER_SHOW, episode_imdb_id, movie_imdb_id
+
+PLATFORMS = ("Netflix", "HBO", "Prime Video", "Disney+", "Cinema")
+# Share of the rows that are movies. The rest are series episodes
+MOVIE_SHARE = 0.3
+MAX_BINGE = 6
+COLUMNS = ("Date", "Movie or Series", "Name", "Platform", "Rating", "IMDB ID")
+
+def parse_amount(value):
+    """Params:
+        value: String. An amount, with an optional k (thousands) or M (millions) suffix.
+    Returns an int.
+    """
+    multipliers = {"k": 1000, "K": 1000, "m": 1000000, "M": 1000000}
+    if value[-1] in multipliers:
+        return int(float(value[:-1]) * multipliers[value[-1]])
+    return int(value)
+
+def generate_rows(rows, titles, seed):
+    """Params:
+        rows: Int. The amount of rows.
+        titles: Int. The amount of different movies and shows.
+        seed: Int. The seed of the random generator.
+    Yields a dictionary for each row, with the COLUMNS as keys. The rows are in chronological order.
+    """
+    rnd = random.Random(seed)
+    movies = max(1, int(titles * MOVIE_SHARE))
+    shows = max(1, titles - movies)
+    date = datetime(2020, 1, 1)
+    step = timedelta(days=365) / rows
+    written = 0
+    while written < rows:
+        if rnd.random() < MOVIE_SHARE:
+            movie = int(rnd.paretovariate(1.1)) % movies
+            entries = [("Movie", "Movie {}".format(movie), movie_imdb_id(movie))]
+        else:
+            show = int(rnd.paretovariate(1.1)) % shows
+            season = rnd.randint(1, SEASONS_PER_SHOW)
+            first = rnd.randint(1, EPISODES_PER_SEASON)
+            last = min(EPISODES_PER_SEASON, first + rnd.randint(0, MAX_BINGE - 1))
+            entries = [("Series", "Show {} S{:02d}E{:02d}".format(show, season, episode), episode_imdb_id(show, season, episode)) for episode in range(first, last + 1)]
+        platform = rnd.choice(PLATFORMS)
+        for content_type, name, imdb_id in entries[:rows - written]:
+            yield {
+                "Date": "{}/{}/{}".format(date.month, date.day, date.year),
+                "Movie or Series": content_type,
+                "Name": name,
+                "Platform": platform,
+                "Rating": "{:.1f}".format(rnd.randint(2, 20) / 2.0),
+                "IMDB ID": imdb_id,
+            }
+            written += 1
+            date += step
+
+def write_history(file_name, rows, titles=None, seed=0):
+    """Params:
+        file_name: String. The TSV file to write.
+        rows: Int. The amount of rows.
+        titles: Int. Optional. The amount of different movies and shows. By default, one for every 20 rows, between 100 and 50000.
+        seed: Int. The seed of the random generator.
+    Returns nothing. Writes the file.
+    """
+    if titles is None:
+        titles = min(50000, max(100, rows // 20))
+    with open(file_name, "w", newline="") as f:
+        writer = csv.DictWriter(f, COLUMNS, delimiter="\t", lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(generate_rows(rows, titles, seed))
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates a synthetic watching habits file")
+    parser.add_argument("--rows", type=parse_amount, default=parse_amount("100k"), help="Amount of rows, i.e. 1k, 100k or 1M (default: 100k)")
+    parser.add_argument("--titles", type=int, help="Amount of different movies and shows (default: one for every 20 rows)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="TSV file to write (default: history_<rows>.tsv)")
+    args = parser.parse_args()
+    file_name = args.output or "history_{}.tsv".format(args.rows)
+    write_history(file_name, args.rows, args.titles, args.seed)
+    print("{} rows written to {}".format(args.rows, file_name))
+
+if __name__ == "__main__":
+    main()
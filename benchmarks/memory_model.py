@@ -0,0 +1,106 @@
+"""Memory benchmark of the content model on a synthetic watching history.
+
+The same synthetic history is built twice: once with plain __dict__ objects holding lists, the way the content model used to be,
+and once with the current __slots__ model with tuples and interned names. Each row gets its own content object built from freshly
+decoded JSON, as it happens when every row is enriched from the API responses.
+
+Usage: python3 benchmarks/memory_model.py [--rows 100000] [--titles 20000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from year_in_review import MAX_CAST, MAX_DIRECTORS, Content, WatchedContent
+
+GENRES = 20
+ACTORS = 50000
+DIRECTORS = 5000
+COMPANIES = 3000
+PLATFORMS = ("Netflix", "HBO", "Prime Video", "Disney+", "Cinema")
+
+class PlainContent():
+    """The content model as it was before, with a __dict__ and a list for each kind of name"""
+    def __init__(self, record):
+        self.tmdb_id = record["tmdb_id"]
+        self.title = record["title"]
+        self.genres = list(record["genres"])
+        self.is_movie = record["is_movie"]
+        self.is_series = not self.is_movie
+        self.actors = list(record["actors"])
+        self.directors = list(record["directors"])
+        self.production_companies = list(record["production_companies"])
+        self.release_date = datetime.strptime(record["release_date"], "%Y-%m-%d")
+        self.runtime = record["runtime"]
+
+class PlainWatchedContent():
+    def __init__(self, content, platform, date, rating):
+        self.content = content
+        self.platform = platform
+        self.date = date
+        self.rating = rating
+
+def generate_titles(amount, seed):
+    """Params:
+        amount: Int. The amount of titles.
+        seed: Int. The seed of the random generator.
+    Returns a list with the JSON of the record of each title, as stored by Content.to_record.
+    """
+    rnd = random.Random(seed)
+    titles = []
+    for tmdb_id in range(amount):
+        titles.append(json.dumps({
+            "tmdb_id": str(tmdb_id),
+            "title": "Title {}".format(tmdb_id),
+            "genres": ["Genre {}".format(rnd.randrange(GENRES)) for _ in range(rnd.randint(1, 3))],
+            "is_movie": True,
+            "actors": ["Actor {}".format(int(rnd.paretovariate(1.2)) % ACTORS) for _ in range(MAX_CAST)],
+            "directors": ["Director {}".format(rnd.randrange(DIRECTORS)) for _ in range(rnd.randint(1, MAX_DIRECTORS))],
+            "production_companies": ["Company {}".format(rnd.randrange(COMPANIES)) for _ in range(rnd.randint(1, 3))],
+            "release_date": "{}-{:02d}-{:02d}".format(rnd.randint(1950, 2020), rnd.randint(1, 12), rnd.randint(1, 28)),
+            "runtime": rnd.randint(20, 180),
+        }))
+    return titles
+
+def build_history(titles, rows, seed, build_content, build_watched):
+    """Params:
+        titles: list of strings, as returned by generate_titles.
+        rows: Int. The amount of rows of the history.
+        seed: Int. The seed of the random generator.
+        build_content: function that builds a content object from a record.
+        build_watched: function that builds a watched content object.
+    Returns a tuple with the history and the amount of bytes allocated to build it.
+    """
+    rnd = random.Random(seed)
+    start = datetime(2015, 1, 1)
+    tracemalloc.start()
+    history = []
+    for _ in range(rows):
+        content = build_content(json.loads(rnd.choice(titles)))
+        date = start + timedelta(days=rnd.randrange(3650))
+        history.append(build_watched(content, rnd.choice(PLATFORMS), date, rnd.randint(1, 20) / 2.0))
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return history, allocated
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory used by the content model on a synthetic history")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--titles", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    titles = generate_titles(args.titles, args.seed)
+    results = []
+    for name, build_content, build_watched in (("__dict__ and lists", PlainContent, PlainWatchedContent), ("__slots__ and interned tuples", Content.from_record, WatchedContent)):
+        history, allocated = build_history(titles, args.rows, args.seed, build_content, build_watched)
+        del history
+        results.append(allocated)
+        print("{}: {:.1f} MiB ({:.0f} bytes per row)".format(name, allocated / 2.0 ** 20, float(allocated) / args.rows))
+    print("Reduction: {:.0f}%".format(100 * (1 - float(results[1]) / results[0])))
+
+if __name__ == "__main__":
+    main()
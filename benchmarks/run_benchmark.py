@@ -0,0 +1,149 @@
+"""Benchmark of the enrichment and the reports, against the local stand-in of the TMDB API (check fake_tmdb.py).
+
+The fake API runs on its own process, so it doesn't compete with the script for the interpreter. The history is enriched twice,
+with the same code used by year_in_review.py: first with an empty cache, where the API latency and the rate limit matter, and then
+with the cache already filled, where only the local work does. Then the aggregates and each one of the reports are timed.
+
+Usage: python3 benchmarks/run_benchmark.py --rows 100k [--latency 0.02] [--error-rate 0.01] [--rate-limited-rate 0.01]
+       python3 benchmarks/run_benchmark.py --file history.tsv --base-url http://127.0.0.1:8000/3
+The peak memory is the maximum resident set size of the process, so it's only available on Unix.
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.request import urlopen
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, ".."))
+import year_in_review
+from generate_history import parse_amount, write_history
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def start_fake_api(latency, error_rate, rate_limited_rate, retry_after):
+    """Starts fake_tmdb.py on another process, listening to any free port.
+    Params: check fake_tmdb.start_server.
+    Returns a tuple with the Popen object and the base URL of the API.
+    """
+    command = [sys.executable, os.path.join(BENCHMARKS_DIR, "fake_tmdb.py"), "--port", "0", "--latency", str(latency),
+               "--error-rate", str(error_rate), "--rate-limited-rate", str(rate_limited_rate), "--retry-after", str(retry_after)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, universal_newlines=True)
+    line = process.stdout.readline()
+    if not line.startswith("Serving on "):
+        process.kill()
+        raise RuntimeError("The fake API didn't start")
+    return process, line[len("Serving on "):].strip()
+
+def get_peak_memory():
+    """Returns the maximum resident set size of the process in MiB, or None if it isn't available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports it in KiB and macOS in bytes
+    return peak / 2.0 ** 20 if sys.platform == "darwin" else peak / 1024.0
+
+def enrich(file_name, cache_file, base_url, workers, rate_limit, fields):
+    """Enriches the history with a new APIRequests object, so nothing of a previous run is kept in memory apart from the cache.
+    Params:
+        file_name: String. The watching habits file.
+        cache_file: String. The SQLite file of the ResponseCache.
+        base_url: String. The base URL of the API.
+        workers: Int. Check year_in_review.enrich_watch_records.
+        rate_limit: Number. The maximum amount of requests per second.
+        fields: a tuple of strings. The fields resolved. Check year_in_review.CONTENT_FIELDS.
+    Returns a tuple with the list of WatchedContent objects and the seconds it took.
+    """
+    cache = year_in_review.ResponseCache(cache_file)
+    requester = year_in_review.APIRequests("benchmark", cache, base_url, rate_limit, max_workers=workers)
+    start = time.perf_counter()
+    # The rows that aren't found are reported by the script, which would flood the output
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        watched_content = list(year_in_review.enrich_watch_records(requester, year_in_review.iter_watching_habits(file_name), workers, fields=fields))
+    elapsed = time.perf_counter() - start
+    cache.close()
+    return watched_content, elapsed
+
+def time_reports(watched_content, columnar, reports):
+    """Params:
+        watched_content: a list of WatchedContent objects.
+        columnar: Boolean. Whether to use the NumPy columnar store.
+        reports: a list of strings. Check year_in_review.REPORTS.
+    Returns a list of (name, seconds) tuples, with the time to build the aggregates first and then the time of each report.
+    """
+    start = time.perf_counter()
+    aggregates = year_in_review.build_aggregates(watched_content, columnar, year_in_review.get_report_dimensions(reports))
+    timings = [("aggregates", time.perf_counter() - start)]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for report in reports:
+            start = time.perf_counter()
+            year_in_review.REPORTS[report][0](aggregates)
+            timings.append((report, time.perf_counter() - start))
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the enrichment and the reports against a local stand-in of the TMDB API")
+    parser.add_argument("--file", help="Watching habits file. By default, a synthetic one is generated")
+    parser.add_argument("--rows", type=parse_amount, default=parse_amount("1k"), help="Rows of the synthetic file, i.e. 1k, 100k or 1M (default: 1k)")
+    parser.add_argument("--titles", type=int, help="Different movies and shows of the synthetic file (default: one for every 20 rows)")
+    parser.add_argument("--base-url", help="URL of an already running stand-in of the API. By default, fake_tmdb.py is started")
+    parser.add_argument("--latency", type=float, default=0.02, help="Average seconds per response of the fake API (default: %(default)s)")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of the requests that fail with a 503 (default: %(default)s)")
+    parser.add_argument("--rate-limited-rate", type=float, default=0, help="Share of the requests rejected with a 429 (default: %(default)s)")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Seconds of the Retry-After header of the 429s (default: %(default)s)")
+    parser.add_argument("--rate-limit", type=float, default=year_in_review.RATE_LIMIT_PER_SECOND,
+                        help="Requests per second allowed by the script (default: %(default)s, as with the real API)")
+    parser.add_argument("--workers", type=int, default=year_in_review.MAX_WORKERS)
+    parser.add_argument("--columnar", action="store_true", help="Build the reports with the NumPy columnar store")
+    parser.add_argument("--reports", type=lambda value: value.split(","), default=list(year_in_review.REPORTS),
+                        help="Comma separated reports to time (default: all of them)")
+    args = parser.parse_args()
+    work_dir = tempfile.mkdtemp(prefix="year_in_review_benchmark_")
+    file_name = args.file
+    if file_name is None:
+        file_name = os.path.join(work_dir, "history.tsv")
+        write_history(file_name, args.rows, args.titles)
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server, base_url = start_fake_api(args.latency, args.error_rate, args.rate_limited_rate, args.retry_after)
+    fields = year_in_review.get_dimension_fields(year_in_review.get_report_dimensions(args.reports))
+    cache_file = os.path.join(work_dir, "cache.sqlite3")
+    try:
+        watched_content, cold = enrich(file_name, cache_file, base_url, args.workers, args.rate_limit, fields)
+        del watched_content
+        watched_content, warm = enrich(file_name, cache_file, base_url, args.workers, args.rate_limit, fields)
+        rows = len(watched_content)
+        timings = time_reports(watched_content, args.columnar, args.reports)
+        stats = None
+        if server is not None or args.base_url is not None:
+            with contextlib.suppress(OSError, ValueError):
+                stats = json.loads(urlopen(base_url.rsplit("/", 1)[0] + "/__stats").read().decode("utf-8"))
+    finally:
+        if server is not None:
+            server.kill()
+    print("Enriched rows: {}".format(rows))
+    print("Enrichment with an empty cache: {:.2f} s ({:.0f} rows/s)".format(cold, rows / cold))
+    print("Enrichment with the cache filled: {:.2f} s ({:.0f} rows/s)".format(warm, rows / warm))
+    print()
+    print("Reports ({})".format("columnar" if args.columnar else "dictionaries"))
+    for name, seconds in timings:
+        print("{}: {:.2f} ms".format(name, seconds * 1000))
+    print()
+    peak = get_peak_memory()
+    if peak is not None:
+        print("Peak memory: {:.1f} MiB".format(peak))
+    if stats:
+        print("Requests served by the fake API")
+        for key, amount in sorted(stats.items()):
+            print("{}: {}".format(key, amount))
+
+if __name__ == "__main__":
+    main()
@@ -1,152 +1,876 @@
 import requests
 import json
+import argparse
+import bisect
 import csv
 import calendar
+import contextlib
+import glob
+import hashlib
+import mmap
 import operator
-from datetime import datetime
-from heapq import nlargest 
+import os
+import random
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from enum import Enum
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from requests.adapters import HTTPAdapter
+# NumPy is optional. It's only needed by the columnar store
+try:
+    import numpy as np
+except ImportError:
+    np = None
+from heapq import heappop, heappush, nlargest
+from urllib.parse import parse_qs, urlencode, urlparse
 
 STATUS_CODE_OK = 200
 BASE_URL = "https://api.themoviedb.org/3"
+# Environment variable that overrides the BASE_URL, i.e. to point the script to a local stand-in of the API (check benchmarks/fake_tmdb.py)
+BASE_URL_VARIABLE = "TMDB_BASE_URL"
 API_KEY = "insert_your_api_key_here"
 CAST_Q = 4
 MAX_CAST = 15
 MAX_DIRECTORS = 2
 TOP_N = 20
+# Amount of values of each ranking shown by the periodic progress output
+PROGRESS_TOP_N = 3
 MIN_THRESHOLD = 5
 MIN_THRESHOLD_FOR_DIRECTORS = 2
+# The ratings are added up as integers, in thousandths, so the sums are exact no matter the order they are added in
+RATING_SCALE = 1000
+CACHE_FILE = "tmdb_cache.sqlite3"
+# Version of the format of the cached responses. A cache with another version is emptied when it's opened
+CACHE_VERSION = 2
+DAY = 24 * 60 * 60
+# Time (in seconds) that a cached response is considered fresh, by endpoint. Movies and episodes rarely change once released,
+# while shows keep adding seasons and episodes.
+CACHE_TTL = {"find": 90 * DAY, "movie": 30 * DAY, "tv": 7 * DAY, "season": 7 * DAY, "episode": 30 * DAY}
+# Kinds of endpoint whose changes are listed by TMDB, so their cached responses can be refreshed with --refresh. The changes of a show
+# include the ones of its seasons and episodes
+CHANGES_KINDS = ("movie", "tv")
+# TMDB only lists the changes of up to 14 days on each request
+MAX_CHANGES_DAYS = 14
+# "Not found" results from /find are kept for less time, since TMDB may add the missing content later
+NEGATIVE_CACHE_TTL = 7 * DAY
+# Responses of these kinds of endpoint are also kept in memory during a run, since they are shared by many rows (i.e. every episode of a show)
+MEMOIZED_KINDS = ("find", "tv", "season")
+# Fields of the content that are requested lazily, only if a report uses them
+CONTENT_FIELDS = ("title", "genres", "actors", "directors", "production_companies", "release_date", "runtime")
+# Fields that need the credits appended to the response
+CREDITS_FIELDS = ("actors", "directors")
+# Fields of an episode that come from the episode details, instead of the show details
+EPISODE_FIELDS = ("actors", "directors", "release_date")
+# TMDB allows around 50 requests per second. I stay a bit below that so the rate limit is never hit on normal conditions
+RATE_LIMIT_PER_SECOND = 40
+RATE_LIMIT_BURST = 20
+REQUEST_TIMEOUT = 10
+# Status codes that are worth retrying: rate limit exceeded and server errors
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+MAX_RETRIES = 5
+# Seconds to wait before the first retry. It's doubled on every new retry, up to MAX_RETRY_BACKOFF
+RETRY_BACKOFF = 0.5
+MAX_RETRY_BACKOFF = 30
+# Amount of rows enriched at the same time. The rate limiter still applies, so more workers only help while the API latency is the bottleneck
+MAX_WORKERS = 8
+WATCHING_HABITS_FILE = "Watching habits.tsv"
+# Amount of rows read from the file before starting to enrich them. Only this many rows are kept in memory at the same time
+STREAM_WINDOW = 500
+# Smaller window used with --progress, so the rows reach the snapshots soon after they are read instead of a whole window later
+PROGRESS_WINDOW = 50
+# Rows of watched content aggregated together by a worker process, when the aggregation is split between processes
+AGGREGATION_CHUNK = 20000
+JOURNAL_FILE = "enriched_journal.jsonl"
+# Rows that couldn't be enriched, so they can be retried later with --retry-dead-letters
+DEAD_LETTER_FILE = "dead_letters.jsonl"
+# Times that the rows that failed with a transient error are retried at the end of the run, and the seconds before the first retry,
+# which are doubled on each retry
+DEAD_LETTER_RETRIES = 2
+DEAD_LETTER_BACKOFF = 5
+# Fields of an episode that are the same for the whole show. They are stored once per show in the catalog
+SHOW_FIELDS = ("title", "genres", "production_companies", "runtime")
+# Layout of the catalog file: a header with the amount of slots of the hash table, the hash table, and the records.
+# Each slot has the hash of the key and the offset and length of the record, which is the key and its JSON separated by a new line
+CATALOG_MAGIC = b"YIRCAT01"
+CATALOG_HEADER = struct.Struct("<8sQ")
+CATALOG_SLOT = struct.Struct("<QQQ")
+# Dimensions that can have millions of values on long histories. With --sketch-capacity, only a fixed amount of them are tracked
+SKETCHED_DIMENSIONS = ("actor", "company")
+# Upper bounds (in milliseconds) of the buckets of the latency histograms of the run profile
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+REPORTS_DIR = "reports"
+# Seconds between checks for new rows in the watching habits file, while serving the reports
+SERVE_POLL_SECONDS = 5
+SERVE_PORT = 8080
 
 class FailedAPIRequest(Exception):
     """Base class for API Requests error"""
+    def __init__(self, message, status_code=None):
+        """Params:
+            message: String. The description of the error.
+            status_code: Int. Optional. The status code of the response that failed.
+        """
+        Exception.__init__(self, message)
+        self.status_code = status_code
+
+class ContentNotFound(Exception):
+    """The IMDB ID of a row isn't in TMDB (or in the offline catalog)"""
     pass
 
 def process_API_response(response, expected_status_code):
     """Simple function to process an API response. Raises an error if the status code is not the excepected one for a correct request"""
     if response.status_code != expected_status_code:
-        raise FailedAPIRequest("The call to {} failed. Expected {} status code but received {}.\n{}".format(response.url, expected_status_code, response.status_code,response.text))
+        # The query string is left out of the message, since it has the API key and the message can be stored in the dead letters
+        url = response.url.split("?")[0]
+        raise FailedAPIRequest("The call to {} failed. Expected {} status code but received {}.\n{}".format(url, expected_status_code, response.status_code, response.text),
+                               response.status_code)
+
+def is_transient_error(error):
+    """Params:
+        error: Exception object. The error of a content. Check call_or_error.
+    Returns True if the request may work later: the API was unreachable, or it kept failing or rate limiting us after every retry.
+    """
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return isinstance(error, FailedAPIRequest) and error.status_code in RETRYABLE_STATUS_CODES
+
+def call_or_error(function, *args):
+    """Params:
+        function: a function that requests info from the API.
+        args: the arguments of the function.
+    Returns what the function returns or, if it raises any error, the error. It's used so one failed content doesn't abort the rest
+    of the contents requested at the same time. The errors are handled row by row: the ones that aren't transient (i.e. unexpected
+    info from the API) are not retried, so the rest of the rows are still enriched. Check is_transient_error.
+    """
+    try:
+        return function(*args)
+    except Exception as e:
+        return e
+
+def get_retry_after(response):
+    """Params:
+        response = Response object.
+    Returns the amount of seconds that the server asked to wait before retrying, or None if the response doesn't say it.
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is None:
+        return None
+    # The header can either be an amount of seconds or a date
+    try:
+        return max(0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        return max(0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RateLimiter():
+    """Token bucket used to keep the requests under the API rate limit. It's safe to share it between threads."""
+    def __init__(self, rate, burst):
+        """Params:
+            rate = Number. The amount of requests allowed per second.
+            burst = Number. The amount of requests that can be done at once after being idle.
+        """
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a request can be done."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            # The token is taken even if there's none available yet. The negative balance makes the next callers wait their turn
+            self._tokens -= 1
+            wait = -self._tokens / self._rate
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stops every request for the given amount of seconds. Used when the API says that the rate limit was exceeded."""
+        with self._lock:
+            self._tokens = min(self._tokens, -seconds * self._rate)
+
+class ResponseCache():
+    """Persistent cache for the API responses, stored in a SQLite file. It's safe to share it between threads."""
+    def __init__(self, file_name):
+        """Params:
+            file_name = String. The path of the SQLite file. It's created if it doesn't exist.
+        """
+        self._connection = sqlite3.connect(file_name, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, body TEXT NOT NULL, expires_at REAL NOT NULL)")
+        # Values about the cache itself, like the date of the last refresh
+        self._connection.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # The responses of older versions are stored whole instead of projected (check PROJECTIONS), so they are dropped
+        if self._connection.execute("PRAGMA user_version").fetchone()[0] != CACHE_VERSION:
+            self._connection.execute("DELETE FROM responses")
+            self._connection.execute("DELETE FROM metadata")
+            self._connection.execute("PRAGMA user_version = {}".format(CACHE_VERSION))
+        self._connection.commit()
+
+    def get(self, key):
+        """Params:
+            key = String. The key of the cached response.
+        Returns the cached response as a dictionary, or None if it isn't cached or it has already expired.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT body, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, body, ttl):
+        """Params:
+            key = String. The key of the response.
+            body = Dictionary. The decoded response to be cached.
+            ttl = Number. The amount of seconds that the response is going to be considered fresh.
+        """
+        body = json.dumps(body)
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO responses (key, body, expires_at) VALUES (?, ?, ?)", (key, body, time.time() + ttl))
+            self._connection.commit()
+
+    def invalidate(self, prefixes):
+        """Params:
+            prefixes = an iterable of strings. The prefixes of the keys of the responses to remove.
+        Returns the amount of responses removed.
+        """
+        removed = 0
+        with self._lock:
+            for prefix in prefixes:
+                # A range of keys instead of a LIKE, so the primary key index is used
+                upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+                removed += self._connection.execute("DELETE FROM responses WHERE key >= ? AND key < ?", (prefix, upper_bound)).rowcount
+            self._connection.commit()
+        return removed
+
+    def get_metadata(self, name):
+        """Params:
+            name = String. The name of the value.
+        Returns the string stored with the name, or None if there isn't one.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM metadata WHERE name = ?", (name,)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_metadata(self, name, value):
+        """Params:
+            name = String. The name of the value.
+            value = String. The value to store.
+        """
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)", (name, value))
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+class NullProfiler():
+    """Profiler that records nothing. It's used when profiling is off, so the instrumentation only costs an empty method call.
+    Check Profiler for the methods.
+    """
+    def count_request(self, kind, status_code, seconds, size):
+        pass
+
+    def count_retry(self, kind):
+        pass
+
+    def count_cache(self, kind, source):
+        pass
+
+    def count_decode(self, kind, seconds):
+        pass
+
+    def stage(self, name):
+        return contextlib.nullcontext()
+
+class Profiler():
+    """Records the requests done by each kind of endpoint and the wall time of each stage of the run. It's safe to share it between threads."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._stages = {}
+        # The stages being timed by each thread, with the time spent on their nested stages
+        self._local = threading.local()
+        self._start = time.perf_counter()
+
+    def _get_endpoint(self, kind):
+        """Private auxiliary method. Must be called with the lock taken.
+        Returns the dictionary with the metrics of the kind of endpoint.
+        """
+        if kind not in self._endpoints:
+            self._endpoints[kind] = {
+                "requests": 0, "retries": 0, "status_codes": {}, "bytes": 0, "latency_seconds": 0.0, "max_latency_seconds": 0.0,
+                "latency_histogram_ms": [0] * (len(LATENCY_BUCKETS_MS) + 1), "decode_seconds": 0.0,
+                "cache": {"memo": 0, "cache": 0, "miss": 0},
+            }
+        return self._endpoints[kind]
+
+    def count_request(self, kind, status_code, seconds, size):
+        """Params:
+            kind: String. The kind of endpoint. Check CACHE_TTL.
+            status_code: Int. The status code of the response, or None if there was no response.
+            seconds: Number. The latency of the request.
+            size: Int. The amount of bytes of the response body.
+        Returns nothing.
+        """
+        bucket = bisect.bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)
+        with self._lock:
+            endpoint = self._get_endpoint(kind)
+            endpoint["requests"] += 1
+            endpoint["status_codes"][str(status_code)] = endpoint["status_codes"].get(str(status_code), 0) + 1
+            endpoint["bytes"] += size
+            endpoint["latency_seconds"] += seconds
+            endpoint["max_latency_seconds"] = max(endpoint["max_latency_seconds"], seconds)
+            endpoint["latency_histogram_ms"][bucket] += 1
+
+    def count_retry(self, kind):
+        """Params:
+            kind: String. The kind of endpoint of the request that is going to be retried.
+        Returns nothing.
+        """
+        with self._lock:
+            self._get_endpoint(kind)["retries"] += 1
+
+    def count_cache(self, kind, source):
+        """Params:
+            kind: String. The kind of endpoint.
+            source: String. Where the response came from: "memo" (already seen in this run), "cache" (the ResponseCache) or "miss" (the API).
+        Returns nothing.
+        """
+        with self._lock:
+            self._get_endpoint(kind)["cache"][source] += 1
+
+    def count_decode(self, kind, seconds):
+        """Params:
+            kind: String. The kind of endpoint.
+            seconds: Number. The time spent decoding the JSON of a response.
+        Returns nothing.
+        """
+        with self._lock:
+            self._get_endpoint(kind)["decode_seconds"] += seconds
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Times the code run inside the with statement. The same stage can be timed many times, and the times are added up.
+        Params:
+            name: String. The name of the stage.
+        """
+        if not hasattr(self._local, "nested"):
+            self._local.nested = []
+        self._local.nested.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._local.nested.pop()
+            if self._local.nested:
+                self._local.nested[-1] += elapsed
+            with self._lock:
+                stage = self._stages.setdefault(name, {"calls": 0, "seconds": 0.0, "self_seconds": 0.0})
+                stage["calls"] += 1
+                stage["seconds"] += elapsed
+                stage["self_seconds"] += elapsed - nested
+
+    def to_dict(self):
+        """Returns a dictionary with the run profile, that can be stored as JSON.
+        The seconds of a stage include the ones of its nested stages, while the self_seconds don't.
+        """
+        with self._lock:
+            endpoints = json.loads(json.dumps(self._endpoints))
+            stages = json.loads(json.dumps(self._stages))
+        bounds = ["<={}".format(bound) for bound in LATENCY_BUCKETS_MS] + [">{}".format(LATENCY_BUCKETS_MS[-1])]
+        lookups = {"memo": 0, "cache": 0, "miss": 0}
+        for endpoint in endpoints.values():
+            endpoint["latency_histogram_ms"] = dict(zip(bounds, endpoint["latency_histogram_ms"]))
+            endpoint["average_latency_seconds"] = endpoint["latency_seconds"] / endpoint["requests"] if endpoint["requests"] else None
+            total = sum(endpoint["cache"].values())
+            endpoint["cache"]["hit_ratio"] = 1 - float(endpoint["cache"]["miss"]) / total if total else None
+            for source in lookups:
+                lookups[source] += endpoint["cache"][source]
+        total = sum(lookups.values())
+        return {
+            "wall_seconds": time.perf_counter() - self._start,
+            "requests": sum(endpoint["requests"] for endpoint in endpoints.values()),
+            "cache_hit_ratio": 1 - float(lookups["miss"]) / total if total else None,
+            "endpoints": endpoints,
+            "stages": stages,
+        }
+
+    def write(self, file_name):
+        """Params:
+            file_name: String. The JSON file where the profile is written.
+        Returns nothing.
+        """
+        with open(file_name, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+def is_empty_find_result(body):
+    """Params:
+        body = Dictionary. A decoded response from the find endpoint.
+    Returns True if the IMDB id didn't match any content in the TMDB database.
+    """
+    return all(len(results) == 0 for key, results in body.items() if key.endswith("_results"))
+
+def project_names(items):
+    """Params:
+        items: list of dictionaries with a name, like the genres, the production companies or the cast.
+    Returns a list of dictionaries with only the name.
+    """
+    return [{"name": item["name"]} for item in items]
+
+def project_credits(credits):
+    """Params:
+        credits: Dictionary. The cast and crew appended to a response.
+    Returns a dictionary with the first MAX_CAST actors and the first MAX_DIRECTORS directors, which are the only ones used.
+    """
+    directors = [{"job": "Director", "name": crew["name"]} for crew in credits["crew"] if crew["job"] == "Director"]
+    return {"cast": project_names(credits["cast"][:MAX_CAST]), "crew": directors[:MAX_DIRECTORS]}
+
+def project_find(body):
+    """Params:
+        body: Dictionary. A decoded response from the find endpoint.
+    Returns a dictionary with only the movie and episode results, with their IDs.
+    """
+    return {
+        "movie_results": [{"id": result["id"]} for result in body.get("movie_results", [])],
+        "tv_episode_results": [
+            {"id": result["id"], "show_id": result["show_id"], "season_number": result["season_number"], "episode_number": result["episode_number"]}
+            for result in body.get("tv_episode_results", [])
+        ],
+    }
+
+def project_movie(body):
+    """Params:
+        body: Dictionary. A decoded response from the movie details endpoint.
+    Returns a dictionary with only the fields used by Movie.
+    """
+    projection = {
+        "id": body["id"],
+        "original_title": body["original_title"],
+        "genres": project_names(body.get("genres", [])),
+        "production_companies": project_names(body.get("production_companies", [])),
+        "release_date": body.get("release_date"),
+        "runtime": body.get("runtime"),
+    }
+    if "credits" in body:
+        projection["credits"] = project_credits(body["credits"])
+    return projection
+
+def project_show(body):
+    """Params:
+        body: Dictionary. A decoded response from the show details endpoint.
+    Returns a dictionary with only the fields used by SeriesEpisode.
+    """
+    return {
+        "id": body["id"],
+        "original_name": body["original_name"],
+        "genres": project_names(body.get("genres", [])),
+        "production_companies": project_names(body.get("production_companies", [])),
+        "episode_run_time": body.get("episode_run_time", []),
+    }
+
+def project_episode(body):
+    """Params:
+        body: Dictionary. A decoded response from the episode details endpoint, or an episode of the season details.
+    Returns a dictionary with only the fields used by SeriesEpisode.
+    """
+    projection = {"episode_number": body["episode_number"], "air_date": body.get("air_date")}
+    if "crew" in body:
+        projection["crew"] = project_credits({"cast": [], "crew": body["crew"]})["crew"]
+    if "credits" in body:
+        projection["credits"] = project_credits(body["credits"])
+    return projection
+
+def project_season(body):
+    """Params:
+        body: Dictionary. A decoded response from the season details endpoint.
+    Returns a dictionary with only the fields used by SeriesEpisode.
+    """
+    projection = {"episodes": [project_episode(episode) for episode in body.get("episodes", [])]}
+    if "credits" in body:
+        projection["credits"] = project_credits(body["credits"])
+    return projection
+
+# Function that keeps only the fields used by the content objects, for each kind of endpoint. The responses are projected as soon as
+# they arrive, so the ones kept in memory and in the cache are a fraction of the size of the whole ones (i.e. without the full credits)
+PROJECTIONS = {"find": project_find, "movie": project_movie, "tv": project_show, "season": project_season, "episode": project_episode}
 
 class APIRequests():
     """Base object to handle all API Requests"""
-    def __init__(self, api_key):
+    def __init__(self, api_key, cache=None, base_url=None, rate_limit=RATE_LIMIT_PER_SECOND, profiler=None, season_cast=False, max_workers=MAX_WORKERS):
         """Params:
             api_key = String. The API key provided by TMDB to make automated requests
+            cache = ResponseCache object. Optional. If it's provided, the responses are looked up there before doing the request and stored after it.
+            base_url = String. Optional. The URL the endpoints are relative to. By default, BASE_URL.
+            rate_limit = Number. The maximum amount of requests per second.
+            profiler = Profiler object. Optional. If it's provided, the requests and the cache lookups are recorded on it.
+            season_cast = Boolean. Whether the episodes are taken from the details of their season, with the cast of the whole season,
+                instead of requesting each one of them. Check SeriesEpisode.
+            max_workers = Int. The maximum amount of threads doing requests at the same time. A keep-alive connection is kept for each one.
         """
         self.api_key = api_key
+        self.season_cast = season_cast
+        self.cache = cache
+        self.base_url = base_url or BASE_URL
+        self.profiler = profiler or NullProfiler()
+        self._memo = {}
+        # One lock per memoized request, so threads asking for the same show or season wait for the first one instead of repeating the request
+        self._memo_locks = {}
+        self._memo_locks_lock = threading.Lock()
+        # A single session is used for all the requests, so the connections to the API are reused instead of doing a new handshake every time
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._limiter = RateLimiter(rate_limit, RATE_LIMIT_BURST)
+
+    def _get(self, endpoint, params, kind, cached_only=False):
+        """Private auxiliary method that does the GET requests, going through the cache if there's one.
+        Params:
+            endpoint = String. The endpoint to be requested, relative to the base URL.
+            params = Dictionary. The query parameters, without the API key.
+            kind = String. The kind of endpoint, used to pick the TTL of the cached response. Check CACHE_TTL.
+            cached_only = Boolean. If it's True, the request isn't done and None is returned when the response isn't already cached.
+        Returns a dictionary with the decoded JSON response, projected to the fields that are used. Check PROJECTIONS.
+        """
+        # The API key is left out of the key, so changing it doesn't invalidate the cache
+        key = endpoint + "?" + urlencode(sorted(params.items()))
+        if key in self._memo:
+            if not cached_only:
+                self.profiler.count_cache(kind, "memo")
+            return self._memo[key]
+        if cached_only:
+            return self.cache.get(key) if self.cache is not None else None
+        if kind not in MEMOIZED_KINDS:
+            return self._get_uncached(endpoint, params, kind, key)
+        with self._memo_locks_lock:
+            lock = self._memo_locks.setdefault(key, threading.Lock())
+        with lock:
+            if key in self._memo:
+                self.profiler.count_cache(kind, "memo")
+            else:
+                self._memo[key] = self._get_uncached(endpoint, params, kind, key)
+        return self._memo[key]
+
+    def _get_uncached(self, endpoint, params, kind, key):
+        """Private auxiliary method. Same as _get, but without looking at the responses already seen in this run.
+        Params:
+            endpoint, params and kind = Check _get.
+            key = String. The cache key of the request.
+        Returns a dictionary with the decoded JSON response.
+        """
+        if self.cache is not None:
+            body = self.cache.get(key)
+            if body is not None:
+                self.profiler.count_cache(kind, "cache")
+                return body
+        self.profiler.count_cache(kind, "miss")
+        response = self._request(endpoint, params, kind)
+        start = time.perf_counter()
+        body = PROJECTIONS[kind](response.json())
+        self.profiler.count_decode(kind, time.perf_counter() - start)
+        if self.cache is not None:
+            if kind == "find" and is_empty_find_result(body):
+                ttl = NEGATIVE_CACHE_TTL
+            else:
+                ttl = CACHE_TTL[kind]
+            self.cache.set(key, body, ttl)
+        return body
+
+    def _request(self, endpoint, params, kind):
+        """Private auxiliary method that does the request, retrying it with an exponential backoff if the API is rate limiting us,
+        failing or unreachable. If the API sends a Retry-After header, it's used instead of the backoff.
+        Params:
+            endpoint, params and kind = Check _get.
+        Returns the Response object. Raises FailedAPIRequest if the request keeps failing after MAX_RETRIES retries.
+        """
+        retries = 0
+        while True:
+            self._limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = self._session.get(self.base_url + endpoint, params=dict(params, api_key=self.api_key), timeout=REQUEST_TIMEOUT)
+            except (requests.ConnectionError, requests.Timeout):
+                self.profiler.count_request(kind, None, time.perf_counter() - start, 0)
+                if retries >= MAX_RETRIES:
+                    raise
+                wait = None
+            else:
+                self.profiler.count_request(kind, response.status_code, time.perf_counter() - start, len(response.content))
+                if response.status_code not in RETRYABLE_STATUS_CODES or retries >= MAX_RETRIES:
+                    process_API_response(response, STATUS_CODE_OK)
+                    return response
+                wait = get_retry_after(response)
+                if response.status_code == 429 and wait is not None:
+                    # Every other request would also be rejected, so all of them wait
+                    self._limiter.pause(wait)
+            if wait is None:
+                # The jitter avoids having all the waiting requests retrying at the same time
+                wait = min(MAX_RETRY_BACKOFF, RETRY_BACKOFF * 2 ** retries) * random.uniform(0.5, 1)
+            retries += 1
+            self.profiler.count_retry(kind)
+            time.sleep(wait)
 
-    def get_info_from_imdb_id(self, imdb_id):
+    def get_info_from_imdb_id(self, imdb_id, cached_only=False):
         """Looks for the all the information available from an IMDB ID in the TMDB database.
         Params:
             imdb_id = String. The imdb id of the content to be searched for. The IMDB id can be obtained from the content URL.
-        Returns a JSON object with the response code and content. 
+            cached_only = Boolean. If it's True, no request is done and None is returned when the response isn't cached.
+        Returns a dictionary with the decoded JSON response. 
         For the returned info, check https://developers.themoviedb.org/3/find/find-by-id
         """
         endpoint = "/find/" + imdb_id
-        params = {"api_key": self.api_key, "external_source": "imdb_id"}
-        response = requests.get(BASE_URL + endpoint, params=params)
-        process_API_response(response, STATUS_CODE_OK)
-        return response
+        params = {"external_source": "imdb_id"}
+        return self._get(endpoint, params, "find", cached_only)
 
-    def get_movie_info(self, movie_id):
+    def get_movie_info(self, movie_id, credits=True, cached_only=False):
         """Gets the movie details from an TMDB ID.
         Params:
             movie_id =  String. The TMDB id of the movie.
-        Returns a JSON object with the response code and content. 
+            credits = Boolean. Whether to include the cast and crew.
+            cached_only = Boolean. If it's True, no request is done and None is returned when the response isn't cached.
+        Returns a dictionary with the decoded JSON response. 
         For the returned info, check https://developers.themoviedb.org/3/movies/get-movie-details
         """
         endpoint = "/movie/" + movie_id 
         # The append_to_response parameter is used to add the information about crew and cast to the response without the need to do another query
-        params = {"api_key": self.api_key, "append_to_response": "credits"}
-        response = requests.get(BASE_URL + endpoint, params=params)
-        process_API_response(response, STATUS_CODE_OK)
-        return response
+        params = {"append_to_response": "credits"} if credits else {}
+        return self._get(endpoint, params, "movie", cached_only)
 
-    def get_show_info(self, show_id):
+    def get_show_info(self, show_id, cached_only=False):
         """Gets the show details from an TMDB ID. 
         Params:
             show_id = String. The TMDB ID for TV show.
-        Returns a JSON object with the response code and content. 
+            cached_only = Boolean. If it's True, no request is done and None is returned when the response isn't cached.
+        Returns a dictionary with the decoded JSON response. 
         For the returned info, check https://developers.themoviedb.org/3/tv/get-tv-details
         """
         endpoint = "/tv/" + show_id 
-        # The append_to_response parameter is used to add the information about crew and cast to the response without the need to do another query
-        params = {"api_key": self.api_key, "append_to_response": "credits"}
-        response = requests.get(BASE_URL + endpoint, params=params)
-        process_API_response(response, STATUS_CODE_OK)
-        return response
+        # The cast and crew of the episodes are used instead of the ones of the show, so the credits aren't requested
+        params = {}
+        return self._get(endpoint, params, "tv", cached_only)
 
-    def get_episode_info(self, show_id, season, episode):
+    def get_episode_info(self, show_id, season, episode, credits=True, cached_only=False):
         """Gets the episode details from an TMDB ID. 
         Params:
             show_id = String. The TMDB ID for the show.
             season: String. The season number to which the episode belongs to.
             episode: String. The episode number.
-        Returns a JSON object with the response code and content. 
+            credits = Boolean. Whether to include the cast and crew.
+            cached_only = Boolean. If it's True, no request is done and None is returned when the response isn't cached.
+        Returns a dictionary with the decoded JSON response. 
         For the returned info, check https://developers.themoviedb.org/3/tv-episodes/get-tv-episode-details
         """
         endpoint = "/tv/" + show_id + "/season/" + season + "/episode/" + episode 
         # The append_to_response parameter is used to add the information about crew and cast to the response without the need to do another query
-        params = {"api_key": self.api_key, "append_to_response": "credits"}
-        response = requests.get(BASE_URL + endpoint, params=params)
-        process_API_response(response, STATUS_CODE_OK)
-        return response
+        params = {"append_to_response": "credits"} if credits else {}
+        return self._get(endpoint, params, "episode", cached_only)
+
+    def get_season_info(self, show_id, season, credits=True, cached_only=False):
+        """Gets the season details, including all its episodes, from an TMDB ID. 
+        Params:
+            show_id = String. The TMDB ID for the show.
+            season: String. The season number.
+            credits = Boolean. Whether to include the cast of the season.
+            cached_only = Boolean. If it's True, no request is done and None is returned when the response isn't cached.
+        Returns a dictionary with the decoded JSON response. 
+        For the returned info, check https://developers.themoviedb.org/3/tv-seasons/get-tv-season-details
+        """
+        endpoint = "/tv/" + show_id + "/season/" + season
+        # The append_to_response parameter is used to add the information about crew and cast to the response without the need to do another query
+        params = {"append_to_response": "credits"} if credits else {}
+        return self._get(endpoint, params, "season", cached_only)
+
+    def get_changes(self, kind, start_date, end_date, page=1):
+        """Gets the IDs of the content that changed in TMDB between two dates.
+        Params:
+            kind = String. One of the CHANGES_KINDS.
+            start_date and end_date = datetime objects. The first and the last day, which can be up to MAX_CHANGES_DAYS apart.
+            page = Int. The page of the results.
+        Returns a dictionary with the decoded JSON response. The changes are never cached, since they tell which cached responses are outdated.
+        For the returned info, check https://developers.themoviedb.org/3/changes/get-movie-change-list
+        """
+        endpoint = "/" + kind + "/changes"
+        params = {"start_date": start_date.strftime("%Y-%m-%d"), "end_date": end_date.strftime("%Y-%m-%d"), "page": page}
+        return self._request(endpoint, params, "changes").json()
+
+def intern_names(names):
+    """Params:
+        names: an iterable of strings, like actors, directors, companies or genres.
+    Returns a tuple with the names. The names are interned, so the same name is stored only once no matter how many times it appears.
+    """
+    return tuple(sys.intern(name) for name in names)
+
+def parse_tmdb_date(value):
+    """Params:
+        value: String. A date of the API in the YYYY-MM-DD format. It's null or empty for the content that isn't released yet.
+    Returns a datetime object, or None if there's no date.
+    """
+    if not value:
+        return None
+    year, month, day = value.split("-")
+    return datetime(int(year), int(month), int(day))
+
+# Marks a field of a content that wasn't requested yet
+UNRESOLVED = object()
+
+def lazy_field(name):
+    """Params:
+        name: String. One of the CONTENT_FIELDS.
+    Returns a property for the field, that requests it the first time it's read. Check Content.resolve.
+    """
+    attribute = "_" + name
+    def get_field(self):
+        if getattr(self, attribute) is UNRESOLVED:
+            self.resolve((name,))
+        return getattr(self, attribute)
+    def set_field(self, value):
+        setattr(self, attribute, value)
+    return property(get_field, set_field)
 
 class Content():
+    # The content objects don't have a __dict__, to reduce the memory used by each one of them
+    __slots__ = ("_requester", "tmdb_id", "is_movie", "is_series") + tuple("_" + field for field in CONTENT_FIELDS)
+    title = lazy_field("title")
+    genres = lazy_field("genres")
+    actors = lazy_field("actors")
+    directors = lazy_field("directors")
+    production_companies = lazy_field("production_companies")
+    release_date = lazy_field("release_date")
+    runtime = lazy_field("runtime")
+
     def __init__(self, requester, imdb_id, is_movie):
         """Content base object. Should not be instantiate. Only instantiate the child objects as Movie and SeriesEpisode.
+        Only the TMDB id is requested when the object is created. The rest of the attributes (check CONTENT_FIELDS) are requested the
+        first time they are used, or beforehand with the resolve method. That way, the info that no report uses is never requested.
         Params:
             requester: APIRequests object. It's used to handle all the requests needed to populate the object with info.
             imdb_id: string. The IMDB of the content. The IMDB id can be obtained from the content URL.
             is_movie: boolean. A very rudimental way to identify what type of object to create
         """
         self._requester = requester
+        self.is_movie = is_movie
+        self.is_series = not self.is_movie
+        for field in CONTENT_FIELDS:
+            setattr(self, "_" + field, UNRESOLVED)
         self.tmdb_id = self._get_tmdb_id(imdb_id)
         # If the tmdb id wasn't found using the imdb id, i set the object in an empty state. I will later use that information 
-        if self.tmdb_id:
-            content_info = self._get_content_info().json()
-            self.title = self._get_title(content_info)
-            self.genres = self._get_genres(content_info)
-            self.is_movie = is_movie
-            self.is_series = not self.is_movie
-            self.actors = self._get_actors(content_info)
-            self.directors = self._get_directors(content_info)
-            self.production_companies = self._get_production_companies(content_info)
-            self.release_date = self._get_release_date(content_info)
-            self.runtime = self._get_runtime(content_info)  
-        else:
-            self.title = None
-            self.genres = None
-            self.is_movie = is_movie
-            self.is_series = not self.is_movie
-            self.actors = None
-            self.directors = None
-            self.pruction_companies = None
-            self.release_date = None
-            self.runtime = None
+        if not self.tmdb_id:
+            for field in CONTENT_FIELDS:
+                setattr(self, "_" + field, None)
+
+    def resolve(self, fields=CONTENT_FIELDS):
+        """Requests the info needed by the given fields, unless they were already resolved.
+        Params:
+            fields: an iterable of strings. Check CONTENT_FIELDS.
+        Returns nothing.
+        """
+        missing = [field for field in fields if getattr(self, "_" + field) is UNRESOLVED]
+        if len(missing) == 0:
+            return
+        if self._requester is None:
+            raise ValueError("The {} of {} weren't resolved and there's no requester to get them".format(", ".join(missing), self.tmdb_id))
+        self._resolve_fields(missing)
+
+    def is_resolved(self, fields=CONTENT_FIELDS, season_cast=False):
+        """Params:
+            fields: an iterable of strings. Check CONTENT_FIELDS.
+            season_cast: Boolean. Whether the cast of the episodes has to be the one of their season. Check APIRequests.
+        Returns True if all the given fields were already resolved.
+        """
+        return all(getattr(self, "_" + field) is not UNRESOLVED for field in fields)
+
+    def resolved_fields(self):
+        """Returns a tuple with the CONTENT_FIELDS that were already resolved."""
+        return tuple(field for field in CONTENT_FIELDS if getattr(self, "_" + field) is not UNRESOLVED)
+
+    @staticmethod
+    def from_record(record, requester=None):
+        """Builds a content object out of a record, without doing any request.
+        Params:
+            record: Dictionary, as returned by to_record.
+            requester: APIRequests object. Optional. It's used to request the fields that weren't resolved when the record was made.
+        Returns either a Movie or a SeriesEpisode object, depending on the record.
+        """
+        content_class = Movie if record["is_movie"] else SeriesEpisode
+        content = content_class.__new__(content_class)
+        content._requester = requester
+        content._load_record(record)
+        return content
+
+    def _load_record(self, record):
+        """Private auxiliary method that sets the attributes from a record. Check from_record."""
+        self.tmdb_id = record["tmdb_id"]
+        self.is_movie = record["is_movie"]
+        self.is_series = not self.is_movie
+        for field in CONTENT_FIELDS:
+            value = record.get(field, UNRESOLVED)
+            if value is UNRESOLVED or value is None:
+                pass
+            elif field == "title":
+                value = sys.intern(value)
+            elif field == "release_date":
+                value = datetime.strptime(value, "%Y-%m-%d")
+            elif field != "runtime":
+                value = intern_names(value)
+            setattr(self, "_" + field, value)
+
+    def to_record(self):
+        """Returns a dictionary with the attributes of the content that can be stored as JSON. The fields that weren't resolved
+        are left out. Check from_record.
+        """
+        record = {"tmdb_id": self.tmdb_id, "is_movie": self.is_movie}
+        for field in CONTENT_FIELDS:
+            value = getattr(self, "_" + field)
+            if value is UNRESOLVED:
+                continue
+            if field == "release_date" and value is not None:
+                value = value.strftime("%Y-%m-%d")
+            record[field] = value
+        return record
 
     def _get_genres(self, content_info):
         """Private auxiliary method. To get the content genres, just use the attribute.
         Params:
             content_info: Json object.
-        Returns a list of strings with the genres of the content.
+        Returns a tuple of strings with the genres of the content.
         """
         genres = [] 
         for genre in content_info["genres"]:
             genres.append(genre["name"])
-        return genres
+        return intern_names(genres)
 
     def _get_production_companies(self, content_info):
         """Private auxiliary method. To get the content production companies, just use the attribute.
         Params:
             content_info: Json object.
-        Returns a list of strings with the production companies of the content.
+        Returns a tuple of strings with the production companies of the content.
         """
         production_companies = []
         for company in content_info["production_companies"]:
             production_companies.append(company["name"])
-        return production_companies
+        return intern_names(production_companies)
 
 
 class Movie(Content):
+    __slots__ = ()
+
     def __init__(self, requester, imdb_id):
         """Params:
             requester: APIRequests object. It's used to handle all the requests needed to populate the object with info.
@@ -162,7 +886,7 @@ class Movie(Content):
             imdb_id = String. The IMDB ID of the movie.
         Returns a string with the tmdb id
         """
-        movie_info = self._requester.get_info_from_imdb_id(imdb_id).json()["movie_results"]
+        movie_info = self._requester.get_info_from_imdb_id(imdb_id)["movie_results"]
         # No results found for that imdb id in the tmdb database
         if len(movie_info) == 0:
             return None
@@ -170,12 +894,23 @@ class Movie(Content):
         else:
             return str(movie_info[0]["id"])
 
-    def _get_content_info(self):
-        """Private auxiliary method to get the movie info that is going to be used to populate the attributes.
-        Returns a JSON object with the response code and content. 
-        For the returned info, check https://developers.themoviedb.org/3/movies/get-movie-details
+    def _resolve_fields(self, fields):
+        """Private auxiliary method that requests the movie info and populates the attributes. To resolve fields, use resolve.
+        All the fields are in the same response, so all of them are populated at once. The credits are only requested if the
+        actors or the directors are needed.
+        Params:
+            fields: a list of strings with the fields that aren't resolved yet.
         """
-        return self._requester.get_movie_info(self.tmdb_id)
+        credits = any(field in CREDITS_FIELDS for field in fields)
+        content_info = self._requester.get_movie_info(self.tmdb_id, credits)
+        self.title = self._get_title(content_info)
+        self.genres = self._get_genres(content_info)
+        self.production_companies = self._get_production_companies(content_info)
+        self.release_date = self._get_release_date(content_info)
+        self.runtime = self._get_runtime(content_info)
+        if credits:
+            self.actors = self._get_actors(content_info)
+            self.directors = self._get_directors(content_info)
 
     def _get_title(self, content_info):
         """Private auxiliary method. To get the title, just use the object's attribute.
@@ -183,13 +918,13 @@ class Movie(Content):
             content_info: Json object.
         Returns a string with the original movie title.
         """
-        return content_info["original_title"]
+        return sys.intern(content_info["original_title"])
 
     def _get_directors(self, content_info):
         """Private auxiliary method. To get the directors, just use the object' attribute.
         Params:
             content_info: Json object.
-        Returns a list of string with the movie directors.
+        Returns a tuple of strings with the movie directors.
         """
         directors = []
         for crew in content_info["credits"]["crew"]:
@@ -197,47 +932,54 @@ class Movie(Content):
                 continue
             else:
                 directors.append(crew["name"])
-        return directors[:MAX_DIRECTORS]
+        return intern_names(directors[:MAX_DIRECTORS])
 
     def _get_actors(self, content_info):
         """Private auxiliary method. To get the content actors, just use the attribute.
         Params:
             content_info: Json object.
-        Returns a list of strings with the cast of the content.
+        Returns a tuple of strings with the cast of the content.
         """
         actors = []
         for actor in content_info["credits"]["cast"][:MAX_CAST]:
             actors.append(actor["name"])
-        return actors
+        return intern_names(actors)
 
     def _get_release_date(self, content_info):
         """Private auxiliary method. To get the release date, just use the object's attribute.
         Params:
             content_info: Json object.
-        Returns a date object with the movie's release date.
+        Returns a date object with the movie's release date, or None if TMDB doesn't know it yet.
         """
-        year, month, day = content_info["release_date"].split("-")
-        return datetime(int(year), int(month), int(day))
+        return parse_tmdb_date(content_info.get("release_date"))
 
     def _get_runtime(self, content_info):
         """Private auxiliary method. To get the runtime, just use the objects attribute.
         Params:
             content_info: Json object.
-        Returns an int that represents the movie's runtime in minutes.
+        Returns an int that represents the movie's runtime in minutes. It's 0 if TMDB doesn't know it yet.
         """
-        return int(content_info["runtime"])
+        return int(content_info.get("runtime") or 0)
             
 
 class SeriesEpisode(Content):
+    """The actors, directors and release date come from the episode details by default. If the requester has season_cast, they come
+    from the details of the season instead, which are requested once for all its episodes. The season details don't have the cast of
+    each episode, so the actors are an approximation: the cast of the whole season, without the guest stars of the episode.
+    """
+    __slots__ = ("show_id", "season", "episode", "season_cast")
+
     def __init__(self, requester, imdb_id):
         """Params:
             requester: APIRequests object. It's used to handle all the requests needed to populate the object with info.
             imdb_id: string. The IMDB of the content. The IMDB id can be obtained from the content URL.
-        Public attributes: check the Content object constructor. show_id (string), season (string) and episode (string) are also added.
+        Public attributes: check the Content object constructor. show_id (string), season (string) and episode (string) are also added,
+            along with season_cast (Boolean), which is True if the actors are the cast of the season.
         """
         self.show_id = None
         self.season = None
         self.episode = None
+        self.season_cast = False
         # The "False" is passed for the "is_movie" attribute.
         Content.__init__(self, requester, imdb_id, False)
 
@@ -247,7 +989,7 @@ class SeriesEpisode(Content):
             imdb_id = String. The IMDB ID of the movie.
         Returns a string with the tmdb id. It also populates the show_id, season and episode attributes.
         """
-        episode_info = self._requester.get_info_from_imdb_id(imdb_id).json()["tv_episode_results"]
+        episode_info = self._requester.get_info_from_imdb_id(imdb_id)["tv_episode_results"]
         # No results found for that imdb id in the tmdb database
         if len(episode_info) == 0:
             self.show_id = None
@@ -261,12 +1003,93 @@ class SeriesEpisode(Content):
             self.episode = str(episode_info[0]["episode_number"])
             return str(episode_info[0]["id"])
 
-    def _get_content_info(self):
-        """Private auxiliary method to get the show info that is going to be used to populate the attributes.
-        Returns a JSON object with the response code and content. 
-        For the returned info, check https://developers.themoviedb.org/3/movies/tv-details
+    def _resolve_fields(self, fields):
+        """Private auxiliary method that requests the show and episode info and populates the attributes. To resolve fields, use resolve.
+        The title, genres, production companies and runtime come from the show info, which is shared by all the episodes of the show.
+        The release date, actors and directors come from the episode info, which is only requested if one of them is needed.
+        Params:
+            fields: a list of strings with the fields that aren't resolved yet.
+        """
+        if any(field not in EPISODE_FIELDS for field in fields):
+            content_info = self._requester.get_show_info(self.show_id)
+            self.title = self._get_title(content_info)
+            self.genres = self._get_genres(content_info)
+            self.production_companies = self._get_production_companies(content_info)
+            self.runtime = self._get_runtime(content_info)
+        if any(field in EPISODE_FIELDS for field in fields):
+            credits = any(field in CREDITS_FIELDS for field in fields)
+            episode_info, season_cast = self._get_episode_info(credits)
+            self.release_date = self._get_release_date(episode_info)
+            if credits:
+                self.actors = self._get_actors(episode_info)
+                self.directors = self._get_directors(episode_info)
+                self.season_cast = season_cast
+
+    def resolve(self, fields=CONTENT_FIELDS):
+        """Requests the info needed by the given fields, unless they were already resolved. Check Content.resolve.
+        The actors resolved with a different season_cast than the one of the requester are requested again.
+        """
+        if "actors" in fields and self._requester is not None and not self.is_resolved(("actors",), self._requester.season_cast):
+            self._actors = UNRESOLVED
+        Content.resolve(self, fields)
+
+    def is_resolved(self, fields=CONTENT_FIELDS, season_cast=False):
+        """Params: check Content.is_resolved.
+        Returns True if all the given fields were already resolved, and the actors come from the season details only if season_cast is True.
+        """
+        if not Content.is_resolved(self, fields):
+            return False
+        # The episodes that weren't found don't have any actor to compare
+        return "actors" not in fields or self._actors is None or self.season_cast == season_cast
+
+    def _get_episode_info(self, credits):
+        """Private auxiliary method to get the episode info used by the directors, actors and release date.
+        Params:
+            credits: Boolean. Whether the cast and crew are needed.
+        Returns a tuple with a dictionary with the decoded JSON response and a boolean that is True if the cast is the one of the season.
+        For the returned info, check https://developers.themoviedb.org/3/tv-episodes/get-tv-episode-details
+        """
+        # With season_cast, every episode is taken from the season details, even if it's the only one watched of its season, so the
+        # info of an episode doesn't depend on which other episodes are in the file
+        if self._requester.season_cast:
+            episode_info = self._get_episode_info_from_season(credits)
+            if episode_info is not None:
+                return episode_info, True
+        return self._requester.get_episode_info(self.show_id, self.season, self.episode, credits), False
+
+    def _load_record(self, record):
+        """Private auxiliary method that sets the attributes from a record. Check Content.from_record."""
+        Content._load_record(self, record)
+        self.show_id = record["show_id"]
+        self.season = record["season"]
+        self.episode = record["episode"]
+        self.season_cast = record.get("season_cast", False)
+
+    def to_record(self):
+        """Returns a dictionary with the attributes of the episode that can be stored as JSON. Check Content.from_record."""
+        record = Content.to_record(self)
+        record["show_id"] = self.show_id
+        record["season"] = self.season
+        record["episode"] = self.episode
+        # Only stored when it's True, so the records of the episode details stay the same
+        if self.season_cast:
+            record["season_cast"] = True
+        return record
+
+    def _get_episode_info_from_season(self, credits):
+        """Private auxiliary method that builds the episode info out of the season details, which are shared by all the episodes of the season.
+        The season details don't have the cast of each episode, so the cast of the season is used instead. Check season_cast.
+        Params:
+            credits: Boolean. Whether the cast and crew are needed.
+        Returns a dictionary with the same structure used by the episode info, or None if the episode isn't in the season details.
         """
-        return self._requester.get_show_info(self.show_id)
+        season_info = self._requester.get_season_info(self.show_id, self.season, credits)
+        for episode_info in season_info["episodes"]:
+            if str(episode_info["episode_number"]) == self.episode:
+                if not credits:
+                    return {"air_date": episode_info["air_date"]}
+                return {"air_date": episode_info["air_date"], "credits": {"cast": season_info.get("credits", {}).get("cast", []), "crew": episode_info.get("crew", [])}}
+        return None
 
     def _get_title(self, content_info):
         """Private auxiliary method. To get the title, just use the object's attribute.
@@ -274,57 +1097,58 @@ class SeriesEpisode(Content):
             content_info: Json object.
         Returns a string with the original show title.
         """
-        return content_info["original_name"]
+        return sys.intern(content_info["original_name"])
 
-    def _get_directors(self, content_info):
+    def _get_directors(self, episode_info):
         """Private auxiliary method. To get the directors, just use the object' attribute.
         Params:
-            content_info: Json object.
-        Returns a list of strings with the episode's directors.
+            episode_info: Json object.
+        Returns a tuple of strings with the episode's directors.
         """
-        content_info = self._requester.get_episode_info(self.show_id, self.season, self.episode).json()
         directors = []
-        for crew in content_info["credits"]["crew"]:
+        for crew in episode_info["credits"]["crew"]:
             if crew["job"] != "Director":
                 continue
             else:
                 directors.append(crew["name"])
-        return directors[:MAX_DIRECTORS]
+        return intern_names(directors[:MAX_DIRECTORS])
 
-    def _get_actors(self, content_info):
-        """Private auxiliary method. To get the directors, just use the object' attribute.
+    def _get_actors(self, episode_info):
+        """Private auxiliary method. To get the actors, just use the object' attribute.
         Params:
-            content_info: Json object.
-        Returns a list of strings with the episode's directors.
+            episode_info: Json object.
+        Returns a tuple of strings with the episode's cast.
         """
-        content_info = self._requester.get_episode_info(self.show_id, self.season, self.episode).json()
         actors = []
-        for actor in content_info["credits"]["cast"][:MAX_CAST]:
+        for actor in episode_info["credits"]["cast"][:MAX_CAST]:
             actors.append(actor["name"])
-        return actors
+        return intern_names(actors)
 
-    def _get_release_date(self, content_info):
+    def _get_release_date(self, episode_info):
         """Private auxiliary method. To get the release date, just use the object's attribute.
         Params:
-            content_info: Json object.
-        Returns a date object with the episode's release date.
+            episode_info: Json object.
+        Returns a date object with the episode's release date, or None if TMDB doesn't know it yet.
         """
-        content_info = self._requester.get_episode_info(self.show_id, self.season, self.episode).json()
-        year, month, day = content_info["air_date"].split("-")
-        return datetime(int(year), int(month), int(day))
+        return parse_tmdb_date(episode_info.get("air_date"))
 
     def _get_runtime(self, content_info):
         """Private auxiliary method. To get the runtime, just use the objects attribute.
         Params:
             content_info: Json object.
-        Returns an int that represents the episode's runtime in minutes.
+        Returns an int that represents the episode's runtime in minutes. It's 0 if the show doesn't have any runtime.
         """
         # Episodes don't have individual runtime on the API, so this is a work around. I just do an average beteween all the values
         # that are on show's runtime attribute.
-        return int(sum(content_info["episode_run_time"])/len(content_info["episode_run_time"]))
+        run_times = content_info.get("episode_run_time") or []
+        if len(run_times) == 0:
+            return 0
+        return int(sum(run_times)/len(run_times))
 
 
 class WatchedContent():
+    __slots__ = ("content", "platform", "date", "rating")
+
     def __init__(self, content, platform, date, rating):
         """ Represents a watched content. 
         Params and attributes:
@@ -338,277 +1162,2347 @@ class WatchedContent():
         self.date = date
         self.rating = rating
 
-def load_watching_habits_to_memory_from_csv(file_name):
+class ContentType(Enum):
+    MOVIE = "Movie"
+    SERIES = "Series"
+
+class WatchRecord():
+    __slots__ = ("row_hash", "date", "content_type", "name", "platform", "rating", "imdb_id")
+
+    def __init__(self, date, content_type, name, platform, rating, imdb_id, row_hash=None):
+        """ Represents a row of the watching habits file, with its values already parsed.
+        Params and attributes:
+            date: Date object. The date when the content was watched.
+            content_type: ContentType. Whether it's a movie or a series episode.
+            name: String. The name of the content, as written in the file.
+            platform: String. Where the content was watched.
+            rating: Float. How much the content was liked.
+            imdb_id: String. The IMDB ID of the content.
+            row_hash: String. Optional. A hash of the raw row, used to know if it was already enriched on a previous run.
+        """
+        self.row_hash = row_hash
+        self.date = date
+        self.content_type = content_type
+        self.name = name
+        self.platform = platform
+        self.rating = rating
+        self.imdb_id = imdb_id
+
+@lru_cache(maxsize=None)
+def parse_date(date):
     """Params:
-        file_name: string with the name of the file with the watching habits info.
-        The file should have the following columnd: Date, Movie or Series, Name, Platform, Rating, IMDB ID
-        The file should use tab as the column delimiter
-    Returns a list of Dictionaries with all the content watched
+        date: String. A date with the month/day/year format.
+    Returns a date object. The rows of the same day share the same object.
     """
-    with open(file_name, "r") as f:
-        f_csv = csv.DictReader(f, delimiter="\t")
-        ret_value = []
-        for line in f_csv:
-            tmp = {}
-            for key, value in line.items():
-                tmp[key] = value
-            ret_value.append(tmp)
-    return ret_value
-
-def get_most_watched_genres(watched_content):
-    """Params: 
-        watched_content: a list of WatchedContent objects
-    Returns nothing. Prints the most watched genres.
+    month, day, year = date.split("/")
+    return datetime(int(year), int(month), int(day))
+
+def parse_watch_record(line):
+    """Params:
+        line: Dictionary. A row of the watching habits file, as read by csv.DictReader.
+    Returns a WatchRecord object.
     """
-    scores = {}
-    for c in watched_content:
-        for genre in c.content.genres:
-            if genre not in scores:
-                scores[genre] = 0
-            scores[genre] += c.content.runtime
-    print("Most watched genres")
-    for x in nlargest(TOP_N, scores, key = scores.get):
-        print("{}: {}".format(x, scores[x]))
-
-def get_most_liked_genres(watched_content):
-    """Params: 
-        watched_content: a list of WatchedContent objects
-    Returns nothing. Prints the most liked genres.
+    content_type = ContentType.MOVIE if line["Movie or Series"] == "Movie" else ContentType.SERIES
+    row_hash = hashlib.sha1("\t".join(value or "" for value in line.values()).encode("utf-8")).hexdigest()
+    return WatchRecord(parse_date(line["Date"]), content_type, line["Name"], sys.intern(line["Platform"]), float(line["Rating"]), line["IMDB ID"], row_hash)
+
+def parse_watching_habits(lines, report_error=None):
+    """Params:
+        lines: an iterable of strings. The lines of a watching habits file, starting with its header. Check iter_watching_habits.
+        report_error: a function. Optional. It's called with the row and the exception of each row that can't be parsed, which is skipped.
+            By default, the exception is raised.
+    Yields a WatchRecord object for each row, as the lines are read.
     """
-    ratings = {}
-    amount_watched = {}
-    scores = {}
-    for c in watched_content:
-        for genre in c.content.genres:
-            if genre not in ratings:
-                ratings[genre] = 0
-                amount_watched[genre] = 0
-            ratings[genre] += c.rating
-            amount_watched[genre] += 1
-    for genre, rating in ratings.items():
-        # The treshold is in place to avoid "one hit wonders" that may get a very high score
-        if amount_watched[genre] < MIN_THRESHOLD:
+    for line in csv.DictReader(lines, delimiter="\t"):
+        try:
+            record = parse_watch_record(line)
+        except (KeyError, TypeError, ValueError) as e:
+            # A row with less columns than the header has None values
+            if report_error is None:
+                raise
+            report_error(line, e)
             continue
-        scores[genre] = float(rating) / amount_watched[genre]
-
-    print("Best rated genres")
-    for x in nlargest(TOP_N, scores, key = scores.get):
-        print("{}: {}".format(x, scores[x]))
+        yield record
 
-def get_amount_of_movies_and_series_watched(watched_content):
-    """Params: 
-        watched_content: a list of WatchedContent objects
-    Returns nothing. Prints the amount of movies and series episodes watched.
+def iter_watching_habits(file_name, report_error=None):
+    """Params:
+        file_name: string with the name of the file with the watching habits info.
+        The file should have the following columnd: Date, Movie or Series, Name, Platform, Rating, IMDB ID
+        The file should use tab as the column delimiter
+        report_error: check parse_watching_habits.
+    Yields a WatchRecord object for each row, as the file is read. The file is never fully loaded in memory.
     """
-    movie_counter = 0
-    movie_minutes = 0
-    series_counter = 0
-    series_minutes = 0
-    for c in watched_content:
-        if c.content.is_movie:
-            movie_counter += 1
-            movie_minutes += c.content.runtime
-        else:
-            series_counter += 1
-            series_minutes += c.content.runtime
-    print("Amount of movies watched: {} ({} minutes)".format(movie_counter, movie_minutes))
-    print("Amount of series watched: {} ({} minutes)".format(series_counter, series_minutes))
+    with open(file_name, "r") as f:
+        for record in parse_watching_habits(f, report_error):
+            yield record
 
-def get_platform_usage(watched_content):
-    """Params: 
-        watched_content: a list of WatchedContent objects
-    Returns nothing. Prints the usage of each platform.
+def load_watching_habits_to_memory_from_csv(file_name):
+    """Params:
+        file_name: string with the name of the file with the watching habits info. Check iter_watching_habits.
+    Returns a list of WatchRecord objects with all the content watched
     """
-    counter = {}
-    for c in watched_content:
-        if c.platform not in counter:
-            counter[c.platform] = 0
-        counter[c.platform] += c.content.runtime
-    print("Platform usage")
-    for platform, count in counter.items():
-        print("{}: {}".format(platform, count))
+    return list(iter_watching_habits(file_name))
 
-def get_most_watched_actors(watched_content):
-    """Params: 
-        watched_content: a list of WatchedContent objects
-    Returns nothing. Prints the most watched actors.
-    """
-    scores = {}
-    for c in watched_content:
-        for actor in c.content.actors:
-            if actor not in scores:
-                scores[actor] = 0
-            scores[actor] += c.content.runtime
-    print("Most watched actors")
-    for x in nlargest(TOP_N, scores, key = scores.get):
-        print("{}: {}".format(x, scores[x]))
-
-def get_most_liked_actors(watched_content):
-    """Params: 
-        watched_content: a list of WatchedContent objects
-    Returns nothing. Prints the most liked actors.
+def group_episodes_by_season(find_results):
+    """Params:
+        find_results: iterable of dictionaries, as returned by APIRequests.get_info_from_imdb_id.
+    Returns a dictionary with the set of episode numbers found for each (show_id, season) tuple.
     """
-    ratings = {}
-    amount_watched = {}
-    scores = {}
-    for c in watched_content:
-        for actor in c.content.actors:
-            if actor not in ratings:
-                ratings[actor] = 0
-                amount_watched[actor] = 0
-            ratings[actor] += c.rating
-            amount_watched[actor] += 1
-    for actor, rating in ratings.items():
-        # The treshold is in place to avoid "one hit wonders" that may get a very high score
-        if amount_watched[actor] < MIN_THRESHOLD:
+    episodes_by_season = {}
+    for find_info in find_results:
+        episode_info = find_info["tv_episode_results"]
+        if len(episode_info) == 0:
             continue
-        scores[actor] = float(rating) / amount_watched[actor] 
-    print("Best rated actor")
-    for x in nlargest(TOP_N, scores, key = scores.get):
-        print("{}: {}".format(x, scores[x]))
+        season = (str(episode_info[0]["show_id"]), str(episode_info[0]["season_number"]))
+        if season not in episodes_by_season:
+            episodes_by_season[season] = set()
+        episodes_by_season[season].add(episode_info[0]["episode_number"])
+    return episodes_by_season
 
+def get_content_key(record):
+    """Params:
+        record: WatchRecord object.
+    Returns a (imdb_id, is_movie) tuple that identifies the content of the row.
+    """
+    return (record.imdb_id, record.content_type == ContentType.MOVIE)
 
-def get_most_watched_production_companies(watched_content):
-    """Params: 
-        watched_content: a list of WatchedContent objects
-    Returns nothing. Prints the most watched production companies.
+def build_content(requester, imdb_id, is_movie, fields=CONTENT_FIELDS):
+    """Params:
+        requester: APIRequests object.
+        imdb_id: String. The IMDB ID of the content.
+        is_movie: Boolean. Whether to build a Movie or a SeriesEpisode.
+        fields: an iterable of strings. The fields that are resolved right away. Check CONTENT_FIELDS.
+    Returns either a Movie or a SeriesEpisode object.
     """
-    scores = {}
-    for c in watched_content:
-        for p_d in c.content.production_companies:
-            if p_d not in scores:
-                scores[p_d] = 0
-            scores[p_d] += c.content.runtime
-    print("Most watched production_companies")
-    for x in nlargest(TOP_N, scores, key = scores.get):
-        print("{}: {}".format(x, scores[x]))
-
-def get_most_liked_production_companies(watched_content):
-    """Params: 
-        watched_content: a list of WatchedContent objects
-    Returns nothing. Prints the most liked production companies.
+    if is_movie:
+        content = Movie(requester, imdb_id)
+    else:
+        content = SeriesEpisode(requester, imdb_id)
+    if content.tmdb_id:
+        content.resolve(fields)
+    return content
+
+class FetchPlan():
+    """Plans the requests needed to enrich the watching habits. Each IMDB ID is resolved only once, no matter how many times it
+    was watched, and the resulting Movie or SeriesEpisode object is shared by all its rows.
     """
-    ratings = {}
-    amount_watched = {}
-    scores = {}
-    for c in watched_content:
-        for p_d in c.content.production_companies:
-            if p_d not in ratings:
-                ratings[p_d] = 0
-                amount_watched[p_d] = 0
-            ratings[p_d] += c.rating
-            amount_watched[p_d] += 1
-    for p_d, rating in ratings.items():
-        # The treshold is in place to avoid "one hit wonders" that may get a very high score
-        if amount_watched[p_d] < MIN_THRESHOLD:
-            continue
-        scores[p_d] = float(rating) / amount_watched[p_d] 
-    print("Best rated production companies")
-    for x in nlargest(TOP_N, scores, key = scores.get):
-        print("{}: {}".format(x, scores[x]))
+    def __init__(self, requester, records, resolved=None, fields=CONTENT_FIELDS):
+        """Params:
+            requester: APIRequests object.
+            records: an iterable of WatchRecord objects.
+            resolved: Dictionary. Optional. Content already resolved, as returned by run. Its IMDB IDs are left out of the plan, unless
+                they are missing some of the fields.
+            fields: an iterable of strings. The fields used by the reports. The requests that are only needed by other fields aren't done.
+        Public attributes: movie_ids and episode_ids (lists of strings), with the unique IMDB IDs in the order they were first watched.
+            incomplete: list of the (imdb_id, content) tuples of the content already resolved that is missing some of the fields.
+            failures: Dictionary. The error of each (imdb_id, is_movie) tuple that couldn't be resolved by run. Check call_or_error.
+        """
+        self._requester = requester
+        self.fields = tuple(fields)
+        self.movie_ids = []
+        self.episode_ids = []
+        self.incomplete = []
+        self.failures = {}
+        resolved = resolved or {}
+        seen = set()
+        for record in records:
+            key = get_content_key(record)
+            if key in seen:
+                continue
+            seen.add(key)
+            if key in resolved:
+                content = resolved[key]
+                if content.tmdb_id and not content.is_resolved(self.fields, requester.season_cast):
+                    self.incomplete.append((key[0], content))
+                continue
+            if key[1]:
+                self.movie_ids.append(key[0])
+            else:
+                self.episode_ids.append(key[0])
 
+    def count_requests(self):
+        """Counts the requests that running the plan is going to do, without doing any of them. Cached responses are not counted.
+        The details needed by an IMDB ID are only known after looking it up, so for the ones that aren't cached yet the worst case is counted:
+        the details request and, for episodes, a show request each.
+        Only the requests needed by the fields of the plan are counted, and the incomplete content already resolved isn't counted.
+        Returns a tuple with a dictionary with the amount of requests by kind of endpoint and the amount of IMDB IDs whose requests are estimated.
+        """
+        requester = self._requester
+        needs_details = len(self.fields) > 0
+        needs_show = any(field not in EPISODE_FIELDS for field in self.fields)
+        needs_episode = any(field in EPISODE_FIELDS for field in self.fields)
+        credits = any(field in CREDITS_FIELDS for field in self.fields)
+        counts = {"find": 0, "movie": 0, "tv": 0, "season": 0, "episode": 0}
+        estimated = 0
+        for imdb_id in self.movie_ids:
+            find_info = requester.get_info_from_imdb_id(imdb_id, cached_only=True)
+            if find_info is None:
+                counts["find"] += 1
+                counts["movie"] += int(needs_details)
+                estimated += 1
+            elif needs_details and len(find_info["movie_results"]) > 0 and requester.get_movie_info(str(find_info["movie_results"][0]["id"]), credits, cached_only=True) is None:
+                counts["movie"] += 1
+        find_results = []
+        for imdb_id in self.episode_ids:
+            find_info = requester.get_info_from_imdb_id(imdb_id, cached_only=True)
+            if find_info is None:
+                counts["find"] += 1
+                counts["tv"] += int(needs_show)
+                counts["season" if requester.season_cast else "episode"] += int(needs_episode)
+                estimated += 1
+            else:
+                find_results.append(find_info)
+        episodes_by_season = group_episodes_by_season(find_results)
+        if needs_show:
+            shows = set(show_id for show_id, season in episodes_by_season)
+            counts["tv"] += sum(1 for show_id in shows if requester.get_show_info(show_id, cached_only=True) is None)
+        if needs_episode and requester.season_cast:
+            # The episodes are taken from the details of their season
+            for show_id, season in episodes_by_season:
+                if requester.get_season_info(show_id, season, credits, cached_only=True) is None:
+                    counts["season"] += 1
+        elif needs_episode:
+            for (show_id, season), episodes in episodes_by_season.items():
+                for episode in episodes:
+                    if requester.get_episode_info(show_id, season, str(episode), credits, cached_only=True) is None:
+                        counts["episode"] += 1
+        return counts, estimated
 
-def get_most_watched_directors(watched_content):
-    """Params: 
-        watched_content: a list of WatchedContent objects
-    Returns nothing. Prints the most wacthed directors.
+    def run(self, max_workers=MAX_WORKERS):
+        """Resolves every IMDB ID of the plan, doing up to max_workers of them at the same time.
+        Params:
+            max_workers: Int. The maximum amount of IMDB IDs being resolved at the same time.
+        Returns a dictionary with a Movie or SeriesEpisode object for each (imdb_id, is_movie) tuple. Check get_content_key.
+            The fields of the incomplete content are also resolved. The content that fails is left out, and its error is added to failures.
+        """
+        keys = [(imdb_id, True) for imdb_id in self.movie_ids] + [(imdb_id, False) for imdb_id in self.episode_ids]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # The seasons are memoized, so with season_cast the episodes of the same season share a single season request
+            results = executor.map(lambda key: call_or_error(build_content, self._requester, key[0], key[1], self.fields), keys)
+            contents = {}
+            for key, content in zip(keys, results):
+                if isinstance(content, Exception):
+                    self.failures[key] = content
+                else:
+                    contents[key] = content
+            errors = executor.map(lambda entry: call_or_error(entry[1].resolve, self.fields), self.incomplete)
+            for (imdb_id, content), error in zip(self.incomplete, errors):
+                if isinstance(error, Exception):
+                    self.failures[(imdb_id, content.is_movie)] = error
+            return contents
+
+def print_fetch_plan(plan):
+    """Params:
+        plan: FetchPlan object.
+    Returns nothing. Prints the amount of requests that the plan is going to do and how long they should take with the rate limit.
     """
-    scores = {}
-    for c in watched_content:
-        for director in c.content.directors:
-            if director not in scores:
-                scores[director] = 0
-            scores[director] += c.content.runtime
-    print("Most watched directors")
-    for x in nlargest(TOP_N, scores, key = scores.get):
-        print("{}: {}".format(x, scores[x]))
-
-def get_most_liked_directors(watched_content):
-    """Params: 
-        watched_content: a list of WatchedContent objects
-    Returns nothing. Prints the most liked directors.
+    counts, estimated = plan.count_requests()
+    total = sum(counts.values())
+    print("Unique content: {} movies and {} episodes".format(len(plan.movie_ids), len(plan.episode_ids)))
+    for kind, amount in counts.items():
+        print("{}: {}".format(kind, amount))
+    print("Requests to do: {} ({} IMDB IDs aren't cached yet, so their requests are an estimation)".format(total, estimated))
+    print("Minimum time with the rate limit: {:.1f} seconds".format(float(total) / RATE_LIMIT_PER_SECOND))
+
+def get_written_fields(content):
+    """Params:
+        content: Movie or SeriesEpisode object.
+    Returns a tuple with the resolved fields of the content, and whether the actors of an episode are the cast of its season. A content is
+    written again to the journal when they change.
     """
-    ratings = {}
-    amount_watched = {}
-    scores = {}
-    for c in watched_content:
-        for director in c.content.directors:
-            if director not in ratings:
-                ratings[director] = 0
-                amount_watched[director] = 0
-            ratings[director] += c.rating
-            amount_watched[director] += 1
-    for director, rating in ratings.items():
-        # The treshold is in place to avoid "one hit wonders" that may get a very high score
-        if amount_watched[director] < MIN_THRESHOLD_FOR_DIRECTORS:
-            continue
-        scores[director] = float(rating) / amount_watched[director] 
-    print("Best rated director")
-    for x in nlargest(TOP_N, scores, key = scores.get):
-        print("{}: {}".format(x, scores[x]))
+    return content.resolved_fields() + (content.is_series and content.season_cast,)
 
-def get_activity_by_month_and_day(watched_content):
-    """Params: 
-        watched_content: a list of WatchedContent objects
-    Returns nothing. Prints the activity bv mont, the activity by weekday and the day with the most activity.
+class Journal():
+    """Append-only journal of the enriched rows, stored as a JSON lines file. It's used to only enrich the rows that were added
+    or changed since the last run. The rows are identified by their hash, so an edited row is seen as a new one and the old one as removed.
+    Each content is written once, and each row only references its content. The removed rows are marked as such, so they are only
+    reported once.
     """
-    months = {"January": 0, "February": 0, "March": 0, "April": 0, "May": 0, "June": 0, "July": 0, "August": 0, "September": 0, "October": 0, "November": 0, "December": 0}
-    weekday = {"Sunday": 0, "Monday": 0, "Tuesday": 0, "Wednesday": 0, "Thursday": 0, "Friday": 0, "Saturday": 0}
-    days = {}
-    for c in watched_content:
-        months[calendar.month_name[c.date.month]] += c.content.runtime
-        weekday[calendar.day_name[c.date.weekday()]] += c.content.runtime
-        if c.date not in days:
-            days[c.date] = 0
-        days[c.date] += c.content.runtime
-    print("Activity by month")
-    for month, amount in months.items():
-        print("{}: {}".format(month, amount))
+    def __init__(self, file_name, requester=None):
+        """Params:
+            file_name: String. The path of the journal. It's created if it doesn't exist.
+            requester: APIRequests object. Optional. It's given to the content loaded from the journal.
+        Public attributes:
+            rows: set of strings. The hashes of the rows in the journal.
+            contents: Dictionary. The Movie or SeriesEpisode objects in the journal, by (imdb_id, is_movie) tuple. Check get_content_key.
+        """
+        self.file_name = file_name
+        self.rows = set()
+        self.contents = {}
+        # The fields of each content that are in the journal. The content is written again when more fields are resolved
+        self._written_fields = {}
+        # Amount of rows of the journal that were removed, which are left out when it's compacted
+        self._removed = 0
+        try:
+            with open(file_name, "r") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if "row" in entry:
+                        self.rows.add(entry["row"])
+                    elif "removed" in entry:
+                        self.rows.discard(entry["removed"])
+                        self._removed += 1
+                    else:
+                        key = tuple(entry["key"])
+                        self.contents[key] = Content.from_record(entry["content"], requester)
+                        self._written_fields[key] = get_written_fields(self.contents[key])
+        except FileNotFoundError:
+            pass
+        self._file = open(file_name, "a")
+
+    def add(self, record, content):
+        """Params:
+            record: WatchRecord object. The row that was enriched.
+            content: Movie or SeriesEpisode object. The content of the row.
+        Returns nothing. Appends the row, and its content if it isn't already in the journal with the same fields.
+        """
+        key = get_content_key(record)
+        fields = get_written_fields(content)
+        if self._written_fields.get(key) != fields:
+            self.contents[key] = content
+            self._written_fields[key] = fields
+            self._file.write(json.dumps({"key": key, "content": content.to_record()}) + "\n")
+        if record.row_hash not in self.rows:
+            self.rows.add(record.row_hash)
+            self._file.write(json.dumps({"row": record.row_hash}) + "\n")
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self, seen_rows):
+        """Params:
+            seen_rows: set of strings. The hashes of all the rows of the file, as read on this run.
+        Returns the amount of rows in the journal that aren't in the file anymore, because they were removed or edited since the last run.
+        They are marked as removed, and once the removed rows are most of the journal, it's rewritten without them.
+        """
+        removed_rows = self.rows - seen_rows
+        for row_hash in removed_rows:
+            self._file.write(json.dumps({"removed": row_hash}) + "\n")
+        self.rows -= removed_rows
+        self._removed += len(removed_rows)
+        self._file.close()
+        if self._removed > len(self.rows):
+            self._compact(self.rows)
+        return len(removed_rows)
+
+    def discard(self, movie_ids, show_ids):
+        """Params:
+            movie_ids: set of strings. The TMDB IDs of the movies whose content is removed.
+            show_ids: set of strings. The TMDB IDs of the shows whose episodes are removed.
+        Returns the amount of content removed. The rows are kept, so their content is enriched again on the next run. The journal is
+        closed, since it's rewritten.
+        """
+        self._file.close()
+        removed = [key for key, content in self.contents.items() if (content.tmdb_id in movie_ids if content.is_movie else content.show_id in show_ids)]
+        for key in removed:
+            del self.contents[key]
+            del self._written_fields[key]
+        if len(removed) > 0:
+            self._compact(self.rows)
+        return len(removed)
+
+    def _compact(self, seen_rows):
+        """Private auxiliary method. Rewrites the journal with only the rows in seen_rows. All the content is kept, in case it's watched again."""
+        self.rows &= seen_rows
+        self._removed = 0
+        tmp_file_name = self.file_name + ".tmp"
+        with open(tmp_file_name, "w") as f:
+            for key, content in self.contents.items():
+                f.write(json.dumps({"key": key, "content": content.to_record()}) + "\n")
+            for row_hash in self.rows:
+                f.write(json.dumps({"row": row_hash}) + "\n")
+        os.replace(tmp_file_name, self.file_name)
+
+class DeadLetterQueue():
+    """Rows that couldn't be enriched, stored as a JSON lines file so a later run can retry only them. Each entry has the row, the
+    class and the message of the last error, whether the error is transient and how many times the row was attempted, across runs.
+    The file is rewritten when it's closed, with only the rows that failed since it was opened.
+    """
+    def __init__(self, file_name):
+        """Params:
+            file_name: String. The path of the queue. It doesn't need to exist.
+        Public attributes:
+            entries: Dictionary. The entries of the rows that failed since the queue was opened, by row hash.
+        """
+        self.file_name = file_name
+        self.entries = {}
+        # The entries of the previous runs, used to add up the attempts and to retry them
+        self._previous = {}
+        try:
+            with open(file_name, "r") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self._previous[entry["row_hash"]] = entry
+        except FileNotFoundError:
+            pass
+
+    def add(self, record, error, attempts):
+        """Params:
+            record: WatchRecord object. The row that failed.
+            error: Exception object. The last error of the row.
+            attempts: Int. The times the row was attempted on this run.
+        Returns nothing.
+        """
+        previous = self._previous.get(record.row_hash)
+        self.entries[record.row_hash] = {
+            "row_hash": record.row_hash,
+            "row": {
+                "Date": "{}/{}/{}".format(record.date.month, record.date.day, record.date.year),
+                "Movie or Series": record.content_type.value,
+                "Name": record.name,
+                "Platform": record.platform,
+                "Rating": record.rating,
+                "IMDB ID": record.imdb_id,
+            },
+            "error": type(error).__name__,
+            # Only the first line, since the rest of the message of a FailedAPIRequest is the whole response
+            "message": str(error).split("\n")[0],
+            "transient": is_transient_error(error),
+            "attempts": attempts + (previous["attempts"] if previous is not None else 0),
+        }
+
+    def records(self):
+        """Returns a list of WatchRecord objects with the rows that were in the queue when it was opened."""
+        records = []
+        for row_hash, entry in self._previous.items():
+            row = entry["row"]
+            content_type = ContentType.MOVIE if row["Movie or Series"] == "Movie" else ContentType.SERIES
+            records.append(WatchRecord(parse_date(row["Date"]), content_type, row["Name"], sys.intern(row["Platform"]), float(row["Rating"]), row["IMDB ID"], row_hash))
+        return records
+
+    def close(self):
+        """Returns the amount of rows in the queue. Rewrites the file with the rows that failed since the queue was opened, or removes it if there are none."""
+        if len(self.entries) == 0:
+            if os.path.exists(self.file_name):
+                os.remove(self.file_name)
+            return 0
+        tmp_file_name = self.file_name + ".tmp"
+        with open(tmp_file_name, "w") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_file_name, self.file_name)
+        return len(self.entries)
+
+def get_catalog_hash(key):
+    """Params:
+        key: bytes. The key of a catalog record.
+    Returns a non-zero 64 bits int, since 0 marks the empty slots of the hash table.
+    """
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+def get_catalog_key(content_key):
+    """Params:
+        content_key: a (imdb_id, is_movie) tuple. Check get_content_key.
+    Returns the key of the content in the catalog, as bytes.
+    """
+    return "{}:{}".format("movie" if content_key[1] else "episode", content_key[0]).encode("utf-8")
+
+class Catalog():
+    """Read-only snapshot of the content metadata, used to build the reports without reaching the API. It's a single file with a hash
+    table indexed by IMDB ID, which is memory-mapped, so opening it doesn't depend on its size and each lookup only reads a slot and a record.
+    The show info shared by all the episodes of a show is stored once, in a record of the show.
+    """
+    def __init__(self, file_name):
+        """Params:
+            file_name: String. The path of the catalog, as written by Catalog.write.
+        """
+        self.file_name = file_name
+        with open(file_name, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._slots = CATALOG_HEADER.unpack_from(self._map, 0)
+        if magic != CATALOG_MAGIC:
+            raise ValueError("{} isn't a catalog".format(file_name))
+        self._data_offset = CATALOG_HEADER.size + self._slots * CATALOG_SLOT.size
+        # The show records are shared by many episodes, so they are only decoded once
+        self._shows = {}
+
+    def _get_record(self, key):
+        """Private auxiliary method.
+        Params:
+            key: bytes. The key of the record.
+        Returns the decoded record, or None if there's no record with that key.
+        """
+        key_hash = get_catalog_hash(key)
+        # Linear probing, starting at the slot of the hash. The amount of slots is a power of two
+        slot = key_hash & (self._slots - 1)
+        while True:
+            slot_hash, offset, length = CATALOG_SLOT.unpack_from(self._map, CATALOG_HEADER.size + slot * CATALOG_SLOT.size)
+            if slot_hash == 0:
+                return None
+            if slot_hash == key_hash:
+                start = self._data_offset + offset
+                record_key, record = self._map[start:start + length].split(b"\n", 1)
+                if record_key == key:
+                    return json.loads(record)
+            slot = (slot + 1) & (self._slots - 1)
+
+    def get_content(self, content_key):
+        """Params:
+            content_key: a (imdb_id, is_movie) tuple. Check get_content_key.
+        Returns a Movie or SeriesEpisode object that can't do any request, or None if the content isn't in the catalog.
+        """
+        record = self._get_record(get_catalog_key(content_key))
+        if record is None:
+            return None
+        if not record["is_movie"] and record["tmdb_id"] is not None:
+            show_id = record["show_id"]
+            if show_id not in self._shows:
+                self._shows[show_id] = self._get_record("show:{}".format(show_id).encode("utf-8"))
+            record.update(self._shows[show_id])
+        return Content.from_record(record)
+
+    def __iter__(self):
+        """Yields a (content_key, content) tuple for each content in the catalog."""
+        for slot in range(self._slots):
+            slot_hash, offset, length = CATALOG_SLOT.unpack_from(self._map, CATALOG_HEADER.size + slot * CATALOG_SLOT.size)
+            if slot_hash == 0:
+                continue
+            start = self._data_offset + offset
+            kind, imdb_id = self._map[start:start + length].split(b"\n", 1)[0].decode("utf-8").split(":", 1)
+            if kind != "show":
+                content_key = (imdb_id, kind == "movie")
+                yield content_key, self.get_content(content_key)
+
+    def close(self):
+        self._map.close()
+
+    @staticmethod
+    def write(file_name, contents):
+        """Writes a catalog with the given content. The file is replaced at once, so a catalog being read is never left half written.
+        Params:
+            file_name: String. The path of the catalog.
+            contents: Dictionary. The Movie or SeriesEpisode objects by (imdb_id, is_movie) tuple, with all the CONTENT_FIELDS resolved
+                unless they weren't found. Check get_content_key.
+        Returns the amount of content written.
+        """
+        records = {}
+        for content_key, content in contents.items():
+            record = content.to_record()
+            if content.is_series and content.tmdb_id is not None:
+                records["show:{}".format(content.show_id).encode("utf-8")] = dict((field, record.pop(field)) for field in SHOW_FIELDS)
+            records[get_catalog_key(content_key)] = record
+        # At most half of the slots are used, so the probe sequences stay short
+        slots = 1
+        while slots < 2 * len(records):
+            slots *= 2
+        table = [(0, 0, 0)] * slots
+        data = []
+        offset = 0
+        for key, record in records.items():
+            entry = key + b"\n" + json.dumps(record, separators=(",", ":")).encode("utf-8")
+            key_hash = get_catalog_hash(key)
+            slot = key_hash & (slots - 1)
+            while table[slot][0] != 0:
+                slot = (slot + 1) & (slots - 1)
+            table[slot] = (key_hash, offset, len(entry))
+            data.append(entry)
+            offset += len(entry)
+        tmp_file_name = file_name + ".tmp"
+        with open(tmp_file_name, "wb") as f:
+            f.write(CATALOG_HEADER.pack(CATALOG_MAGIC, slots))
+            for slot in table:
+                f.write(CATALOG_SLOT.pack(*slot))
+            for entry in data:
+                f.write(entry)
+        os.replace(tmp_file_name, file_name)
+        return len(contents)
+
+def get_catalog_contents(catalog, records, resolved, fields=CONTENT_FIELDS, season_cast=False):
+    """Looks up the content of the records in the catalog, without doing any request.
+    Params:
+        catalog: Catalog object.
+        records: an iterable of WatchRecord objects.
+        resolved: Dictionary. Content already resolved, which isn't looked up again unless it's missing some of the fields.
+        fields: an iterable of strings. The fields used by the reports. Check CONTENT_FIELDS.
+        season_cast: Boolean. Whether the cast of the episodes has to be the one of their season. Check APIRequests.
+    Returns a tuple with two dictionaries, by (imdb_id, is_movie) tuple (check get_content_key):
+        the Movie or SeriesEpisode object of each content looked up, or None if the content isn't in the catalog.
+        the error of each content whose record in the catalog is missing some of the fields. It can't be requested offline, so its
+            rows are failed instead of raising while they are aggregated.
+    """
+    contents = {}
+    failures = {}
+    for record in records:
+        key = get_content_key(record)
+        if key in contents or key in failures:
+            continue
+        if key in resolved:
+            content = resolved[key]
+            if content is None or content.tmdb_id is None or content.is_resolved(fields, season_cast):
+                continue
+        content = catalog.get_content(key)
+        if content is not None and content.tmdb_id is not None and not content.is_resolved(fields, season_cast):
+            failures[key] = ContentNotFound("{} isn't in the catalog with the info used by the reports (check --season-cast)".format(record.imdb_id))
+            continue
+        contents[key] = content
+    return contents, failures
+
+def build_catalog(requester, records, file_name, max_workers=MAX_WORKERS):
+    """Resolves all the fields of the content of the records and writes them to a catalog, along with the content already in it.
+    Params:
+        requester: APIRequests object.
+        records: an iterable of WatchRecord objects.
+        file_name: String. The path of the catalog. It's created if it doesn't exist.
+        max_workers: Int. The maximum amount of IMDB IDs being resolved at the same time.
+    Returns the amount of content in the catalog.
+    """
+    contents = {}
+    if os.path.exists(file_name):
+        catalog = Catalog(file_name)
+        # The content of the catalog can't do requests, so it's loaded with the requester in case the records need it with another season_cast
+        for key, content in catalog:
+            contents[key] = Content.from_record(content.to_record(), requester)
+        catalog.close()
+    contents.update(FetchPlan(requester, records, contents).run(max_workers))
+    return Catalog.write(file_name, contents)
+
+def get_changed_ids(requester, kind, start_date, end_date):
+    """Params:
+        requester: APIRequests object.
+        kind: String. One of the CHANGES_KINDS.
+        start_date and end_date: datetime objects. The first and the last day. They can be any amount of days apart.
+    Returns a set with the TMDB IDs (as strings) of the content of the kind that changed between the dates.
+    """
+    changed = set()
+    while start_date <= end_date:
+        window_end = min(end_date, start_date + timedelta(days=MAX_CHANGES_DAYS - 1))
+        page = 1
+        while True:
+            changes = requester.get_changes(kind, start_date, window_end, page)
+            changed.update(str(result["id"]) for result in changes["results"])
+            if page >= changes.get("total_pages", 1):
+                break
+            page += 1
+        start_date = window_end + timedelta(days=1)
+    return changed
+
+def refresh_cache(requester, journal=None, now=None):
+    """Removes the cached details of the movies and shows that changed in TMDB since the last refresh, so they are requested again
+    when they are needed. Only the lists of changes are requested, so it takes a few requests no matter how many titles are cached.
+    Params:
+        requester: APIRequests object, with a cache.
+        journal: Journal object. Optional. The content of the changed titles is also removed from it, and it's closed.
+        now: datetime object. Optional. The time of the refresh, in UTC. By default, the current time.
+    Returns a tuple with a dictionary with the amount of changed IDs of each of the CHANGES_KINDS, the amount of responses removed
+    from the cache and the amount of content removed from the journal.
+    """
+    cache = requester.cache
+    now = now or datetime.utcnow()
+    # Without a previous refresh, the oldest details that can still be cached are as old as the longest TTL
+    start_date = now - timedelta(seconds=max(CACHE_TTL[kind] for kind in ("movie", "tv", "season", "episode")))
+    last_refresh = cache.get_metadata("last_refresh")
+    if last_refresh is not None:
+        # The day of the last refresh is included, since the changes made after it on the same day weren't listed
+        start_date = max(start_date, datetime.strptime(last_refresh, "%Y-%m-%d"))
+    changed = dict((kind, get_changed_ids(requester, kind, start_date, now)) for kind in CHANGES_KINDS)
+    prefixes = ["/movie/{}?".format(movie_id) for movie_id in changed["movie"]]
+    # The details of the show, and the ones of its seasons and episodes
+    for show_id in changed["tv"]:
+        prefixes.append("/tv/{}?".format(show_id))
+        prefixes.append("/tv/{}/".format(show_id))
+    removed = cache.invalidate(prefixes)
+    discarded = journal.discard(changed["movie"], changed["tv"]) if journal is not None else 0
+    # The refresh is only recorded once everything was invalidated, so a failed refresh is done again from the same day
+    cache.set_metadata("last_refresh", now.strftime("%Y-%m-%d"))
+    return dict((kind, len(ids)) for kind, ids in changed.items()), removed, discarded
+
+def iter_enriched_records(requester, records, max_workers=MAX_WORKERS, window=STREAM_WINDOW, journal=None, fields=CONTENT_FIELDS, catalog=None,
+                          dead_letters=None, retries=DEAD_LETTER_RETRIES, report_error=None):
+    """Resolves the content of the records with the info from the API as they are read, doing up to max_workers IMDB IDs at the same time.
+    The records are planned and resolved in windows of rows, so only a window is kept in memory and the first requests are done
+    before the rest of the records are read.
+    Params:
+        requester: APIRequests object.
+        records: an iterable of WatchRecord objects.
+        max_workers: Int. The maximum amount of IMDB IDs being resolved at the same time.
+        window: Int. The amount of rows planned together.
+        journal: Journal object. Optional. The content already in the journal isn't requested again, and the new rows are added to it.
+        fields: an iterable of strings. The fields used by the reports, which are resolved before the content is yielded. Check CONTENT_FIELDS.
+        catalog: Catalog object. Optional. If it's provided, the content is taken from it instead of doing requests.
+        dead_letters: DeadLetterQueue object. Optional. The rows that fail are added to it, and it's closed at the end.
+        retries: Int. The times that the rows that fail with a transient error are retried at the end, with a backoff. Check is_transient_error.
+        report_error: a function. Optional. It's called with the record and a message for each row that fails. By default, the message is printed.
+    Yields a (record, content) tuple for each record, in the same order, except for the rows that are retried, which are yielded at the end.
+    The rows that couldn't be found in TMDB (or in the catalog) or that keep failing are reported, added to the dead letters and left out.
+    """
+    # Every IMDB ID is resolved once, and the rows of the same content share the same object
+    contents = dict(journal.contents) if journal is not None else {}
+    seen_rows = set()
+    records = iter(records)
+    profiler = requester.profiler
+    # The (record, error) tuples of the rows that failed with a transient error, which are retried once the rest are done
+    retried = []
+
+    def resolve(chunk):
+        """Resolves the content of the chunk of records. Returns a dictionary with the error of each content key that failed."""
+        if catalog is not None:
+            with profiler.stage("catalog"):
+                catalog_contents, failures = get_catalog_contents(catalog, chunk, contents, fields, requester.season_cast)
+                contents.update(catalog_contents)
+            return failures
+        with profiler.stage("fetch"):
+            plan = FetchPlan(requester, chunk, contents, fields)
+            contents.update(plan.run(max_workers))
+        return plan.failures
+
+    def fail(record, error, attempts, message=None):
+        """Reports the row that failed and adds it to the dead letters."""
+        message = message or "{} ({}) couldn't be enriched: {}".format(record.name, record.imdb_id, type(error).__name__)
+        if report_error is not None:
+            report_error(record, message)
+        else:
+            print(message)
+        if dead_letters is not None:
+            dead_letters.add(record, error, attempts)
+
+    def get_watched(chunk, failures, attempts):
+        """Yields the (record, content) tuple of each record of the chunk whose content was resolved. The rest are retried or failed."""
+        for record in chunk:
+            key = get_content_key(record)
+            if key in failures:
+                if attempts <= retries and is_transient_error(failures[key]):
+                    retried.append((record, failures[key]))
+                else:
+                    fail(record, failures[key], attempts)
+                continue
+            c = contents[key]
+            if c is None:
+                fail(record, ContentNotFound("{} isn't in the catalog".format(record.imdb_id)), attempts, "{} ({}) isn't in the catalog".format(record.name, record.imdb_id))
+                continue
+            if c.tmdb_id == None:
+                fail(record, ContentNotFound("{} isn't in TMDB".format(record.imdb_id)), attempts, "There's an error with {} ({})".format(record.name, record.imdb_id))
+                continue
+            if journal is not None:
+                seen_rows.add(record.row_hash)
+                journal.add(record, c)
+            yield record, c
+
+    while True:
+        with profiler.stage("read"):
+            chunk = list(islice(records, window))
+        if len(chunk) == 0:
+            break
+        # The rows are gone through in order, so the output doesn't depend on which request finishes first
+        for enriched in get_watched(chunk, resolve(chunk), 1):
+            yield enriched
+        if journal is not None:
+            with profiler.stage("journal"):
+                journal.flush()
+    # A transient error, like an outage of the API, may be over after a while
+    for attempt in range(2, retries + 2):
+        if len(retried) == 0:
+            break
+        chunk = [record for record, error in retried]
+        retried = []
+        time.sleep(DEAD_LETTER_BACKOFF * 2 ** (attempt - 2))
+        print("Retrying {} rows that failed".format(len(chunk)))
+        for enriched in get_watched(chunk, resolve(chunk), attempt):
+            yield enriched
+    if journal is not None:
+        with profiler.stage("journal"):
+            removed_rows = journal.close(seen_rows)
+        if removed_rows > 0:
+            print("{} rows of the journal were removed or edited in the file since the last run".format(removed_rows))
+    if dead_letters is not None:
+        failed_rows = dead_letters.close()
+        if failed_rows > 0:
+            print("{} rows couldn't be enriched, they can be retried with --retry-dead-letters (check {})".format(failed_rows, dead_letters.file_name))
+
+def enrich_watch_records(requester, records, max_workers=MAX_WORKERS, window=STREAM_WINDOW, journal=None, fields=CONTENT_FIELDS, catalog=None,
+                         dead_letters=None, retries=DEAD_LETTER_RETRIES):
+    """Builds the watched content with the info from the API as the records are read. The rows that fail are printed.
+    Params: check iter_enriched_records.
+    Yields a WatchedContent object for each record that was enriched, in the same order, except for the rows that were retried.
+    """
+    for record, content in iter_enriched_records(requester, records, max_workers, window, journal, fields, catalog, dead_letters, retries):
+        yield WatchedContent(content, record.platform, record.date, record.rating)
+
+def get_content_type(watched):
+    """Params:
+        watched: WatchedContent object.
+    Returns "Movie" or "Series", depending on the content.
+    """
+    return "Movie" if watched.content.is_movie else "Series"
+
+# Dimensions that the watched content is grouped by, with a function that returns the values of a WatchedContent object for each one.
+DIMENSIONS = {
+    "genre": lambda watched: watched.content.genres,
+    "actor": lambda watched: watched.content.actors,
+    "director": lambda watched: watched.content.directors,
+    "company": lambda watched: watched.content.production_companies,
+    "platform": lambda watched: (watched.platform,),
+    "type": lambda watched: (get_content_type(watched),),
+    "month": lambda watched: (calendar.month_name[watched.date.month],),
+    "weekday": lambda watched: (calendar.day_name[watched.date.weekday()],),
+    "day": lambda watched: (watched.date,),
+}
+
+# Fields of the content needed by each one of the DIMENSIONS. The runtime is needed by all of them
+DIMENSION_FIELDS = {
+    "genre": ("genres",),
+    "actor": ("actors",),
+    "director": ("directors",),
+    "company": ("production_companies",),
+    "platform": (),
+    "type": (),
+    "month": (),
+    "weekday": (),
+    "day": (),
+}
+
+def get_dimension_fields(dimensions):
+    """Params:
+        dimensions: an iterable of strings. Check DIMENSIONS.
+    Returns a tuple with the CONTENT_FIELDS needed to aggregate the given dimensions.
+    """
+    fields = set(["runtime"])
+    for dimension in dimensions:
+        fields.update(DIMENSION_FIELDS[dimension])
+    return tuple(field for field in CONTENT_FIELDS if field in fields)
+
+def get_rating_units(rating):
+    """Params:
+        rating: Number. A rating, as in the watching habits file.
+    Returns an int with the rating in RATING_SCALE units.
+    """
+    return int(round(rating * RATING_SCALE))
+
+class Aggregates():
+    """Minutes watched, amount of times watched and sum of the ratings of the watched content, grouped by each one of the DIMENSIONS.
+    Everything is computed in a single pass over the watched content, and all the reports are built from it.
+    """
+    def __init__(self, watched_content=(), dimensions=None):
+        """Params:
+            watched_content: a list of WatchedContent objects. Optional. More content can be added later with the add method.
+            dimensions: an iterable of strings. Optional. The DIMENSIONS that are aggregated. By default, all of them.
+        Public attributes: runtime, count and rating. Dictionaries with a dictionary for each dimension, that has the metric for each value.
+            The values are kept in the order they were first seen. The rating is the sum of the ratings in RATING_SCALE units.
+        """
+        self.dimensions = dict((dimension, DIMENSIONS[dimension]) for dimension in (DIMENSIONS if dimensions is None else dimensions))
+        self.runtime = {}
+        self.count = {}
+        self.rating = {}
+        for dimension in self.dimensions:
+            self.runtime[dimension] = {}
+            self.count[dimension] = {}
+            self.rating[dimension] = {}
+        for watched in watched_content:
+            self.add(watched)
+
+    def add(self, watched):
+        """Params:
+            watched: WatchedContent object.
+        Returns nothing. Adds the watched content to every dimension.
+        """
+        rating_units = get_rating_units(watched.rating)
+        for dimension, get_values in self.dimensions.items():
+            runtime = self.runtime[dimension]
+            count = self.count[dimension]
+            rating = self.rating[dimension]
+            for value in get_values(watched):
+                if value not in runtime:
+                    runtime[value] = 0
+                    count[value] = 0
+                    rating[value] = 0
+                runtime[value] += watched.content.runtime
+                count[value] += 1
+                rating[value] += rating_units
+
+    def totals(self, dimension):
+        """Params:
+            dimension: String. One of the DIMENSIONS.
+        Returns a dictionary with the minutes watched of each value of the dimension.
+        """
+        return self.runtime[dimension]
+
+    def counts(self, dimension):
+        """Params:
+            dimension: String. One of the DIMENSIONS.
+        Returns a dictionary with the amount of times that each value of the dimension was watched.
+        """
+        return self.count[dimension]
+
+    def top_watched(self, dimension, n=TOP_N):
+        """Params:
+            dimension: String. One of the DIMENSIONS.
+            n: Int. The amount of values to return.
+        Returns a list of (value, minutes watched) tuples with the n most watched values of the dimension.
+        """
+        scores = self.runtime[dimension]
+        return [(x, scores[x]) for x in nlargest(n, scores, key = scores.get)]
+
+    def top_liked(self, dimension, min_threshold=MIN_THRESHOLD, n=TOP_N):
+        """Params:
+            dimension: String. One of the DIMENSIONS.
+            min_threshold: Int. The minimum amount of times that a value has to be watched to be considered.
+            n: Int. The amount of values to return.
+        Returns a list of (value, average rating) tuples with the n best rated values of the dimension.
+        """
+        amount_watched = self.count[dimension]
+        scores = {}
+        for value, rating in self.rating[dimension].items():
+            # The treshold is in place to avoid "one hit wonders" that may get a very high score
+            if amount_watched[value] < min_threshold:
+                continue
+            scores[value] = rating / (amount_watched[value] * RATING_SCALE)
+        return [(x, scores[x]) for x in nlargest(n, scores, key = scores.get)]
+
+    def get_error_bound(self, dimension, liked=False):
+        """Params:
+            dimension: String. One of the DIMENSIONS.
+            liked: Boolean. Whether the bound is for top_liked instead of top_watched.
+        Returns the maximum amount that the scores of the dimension can be overestimated by. It's always 0, since the scores are exact.
+        """
+        return 0
+
+    def merge(self, other):
+        """Adds the metrics of other, as if its watched content had been added after the one already added.
+        Params:
+            other: Aggregates object, with the same dimensions.
+        Returns the Aggregates object itself.
+        """
+        for dimension in self.dimensions:
+            runtime = self.runtime[dimension]
+            count = self.count[dimension]
+            rating = self.rating[dimension]
+            other_count = other.count[dimension]
+            other_rating = other.rating[dimension]
+            for value, value_runtime in other.runtime[dimension].items():
+                if value not in runtime:
+                    runtime[value] = 0
+                    count[value] = 0
+                    rating[value] = 0
+                runtime[value] += value_runtime
+                count[value] += other_count[value]
+                rating[value] += other_rating[value]
+        return self
+
+    def snapshot(self, reports=None):
+        """Params:
+            reports: an iterable of strings. Optional. The reports to include, whose dimensions have to be aggregated. By default, the DEFAULT_REPORTS.
+        Returns a dictionary with the data of each report, as returned by REPORTS_DATA, with the content added so far. After the last
+        content is added, it has the same data as the printed reports.
+        """
+        return dict((report, REPORTS_DATA[report](self)) for report in (DEFAULT_REPORTS if reports is None else reports))
+
+    def __getstate__(self):
+        # The functions of the dimensions can't be pickled, so only their names are sent to (and from) other processes
+        return (tuple(self.dimensions), self.runtime, self.count, self.rating)
+
+    def __setstate__(self, state):
+        dimensions, self.runtime, self.count, self.rating = state
+        self.dimensions = dict((dimension, DIMENSIONS[dimension]) for dimension in dimensions)
+
+class SpaceSaving():
+    """Space-Saving heavy hitters sketch. It keeps a counter for at most capacity values, so the memory doesn't depend on the amount of
+    different values. When a new value arrives and the sketch is full, the value with the lowest counter is replaced and the new value
+    inherits its counter as its error. Every counter overestimates the real total by at most its error, and the values that aren't
+    tracked have a real total not greater than the lowest counter.
+    """
+    def __init__(self, capacity):
+        """Params:
+            capacity: Int. The maximum amount of values tracked.
+        Public attributes: counters. Dictionary with a [total, error, times added, sum of ratings] list for each tracked value.
+            The times added and the sum of ratings only count since the value is tracked.
+        Raises ValueError if the capacity isn't greater than 0, since a new value would have nothing to replace.
+        """
+        if capacity < 1:
+            raise ValueError("The capacity of a sketch has to be greater than 0, not {}".format(capacity))
+        self.capacity = capacity
+        self.counters = {}
+        # A (total, value) entry for each tracked value. The totals are only updated when they reach the top of the heap, so an entry
+        # can be lower than the real total of its value, but never greater
+        self._heap = []
+
+    def add(self, value, weight=1, rating=0):
+        """Params:
+            value: the value to count, i.e. an actor.
+            weight: Number. The amount added to the total of the value.
+            rating: Number. The rating added to the sum of ratings of the value.
+        Returns nothing.
+        """
+        counter = self.counters.get(value)
+        if counter is None:
+            minimum = 0
+            if len(self.counters) >= self.capacity:
+                minimum, evicted = self._pop_minimum()
+                del self.counters[evicted]
+            counter = self.counters[value] = [minimum, minimum, 0, 0]
+            heappush(self._heap, (minimum, value))
+        counter[0] += weight
+        counter[2] += 1
+        counter[3] += rating
+
+    def _pop_minimum(self):
+        """Private auxiliary method.
+        Returns a (total, value) tuple with the tracked value with the lowest total, removing it from the heap.
+        """
+        while True:
+            total, value = heappop(self._heap)
+            if self.counters[value][0] == total:
+                return total, value
+            # The entry was outdated, so it goes back with the current total
+            heappush(self._heap, (self.counters[value][0], value))
+
+    def get_minimum(self):
+        """Returns the lowest total of the tracked values if the sketch is full, or 0 if every value seen is tracked."""
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(counter[0] for counter in self.counters.values())
+
+class SketchAggregates(Aggregates):
+    """Same as Aggregates, but the SKETCHED_DIMENSIONS are tracked with Space-Saving sketches of a fixed capacity instead of exact
+    dictionaries. The most watched values are found as long as they are well above the lowest tracked total, and their minutes can be
+    overestimated by up to get_error_bound. If the capacity is greater than the amount of different values, the results are exact.
+    """
+    def __init__(self, watched_content=(), dimensions=None, capacity=1000):
+        """Params:
+            watched_content and dimensions: check Aggregates.
+            capacity: Int. The amount of values tracked by each sketch.
+        Public attributes: check Aggregates. sketches is a dictionary with the sketch of the minutes watched and the sketch of the amount of
+            times watched (along with the ratings) of each sketched dimension.
+        """
+        dimensions = list(DIMENSIONS if dimensions is None else dimensions)
+        self.sketches = {}
+        for dimension in SKETCHED_DIMENSIONS:
+            if dimension in dimensions:
+                self.sketches[dimension] = (SpaceSaving(capacity), SpaceSaving(capacity))
+        Aggregates.__init__(self, watched_content, [dimension for dimension in dimensions if dimension not in self.sketches])
+
+    def add(self, watched):
+        """Check Aggregates.add"""
+        Aggregates.add(self, watched)
+        for dimension, (watched_sketch, liked_sketch) in self.sketches.items():
+            for value in DIMENSIONS[dimension](watched):
+                watched_sketch.add(value, watched.content.runtime)
+                liked_sketch.add(value, 1, get_rating_units(watched.rating))
+
+    def totals(self, dimension):
+        """Check Aggregates.totals. For a sketched dimension, only the tracked values are returned, with their estimated minutes."""
+        if dimension not in self.sketches:
+            return Aggregates.totals(self, dimension)
+        return dict((value, counter[0]) for value, counter in self.sketches[dimension][0].counters.items())
+
+    def counts(self, dimension):
+        """Check Aggregates.counts. For a sketched dimension, only the tracked values are returned, with their estimated amount."""
+        if dimension not in self.sketches:
+            return Aggregates.counts(self, dimension)
+        return dict((value, counter[0]) for value, counter in self.sketches[dimension][1].counters.items())
+
+    def top_watched(self, dimension, n=TOP_N):
+        """Check Aggregates.top_watched"""
+        if dimension not in self.sketches:
+            return Aggregates.top_watched(self, dimension, n)
+        scores = self.totals(dimension)
+        return [(x, scores[x]) for x in nlargest(n, scores, key = scores.get)]
+
+    def top_liked(self, dimension, min_threshold=MIN_THRESHOLD, n=TOP_N):
+        """Check Aggregates.top_liked. For a sketched dimension, a value is considered only if it was watched at least min_threshold
+        times since it's tracked, and only those ratings are averaged.
+        """
+        if dimension not in self.sketches:
+            return Aggregates.top_liked(self, dimension, min_threshold, n)
+        scores = {}
+        for value, (total, error, amount_watched, rating) in self.sketches[dimension][1].counters.items():
+            # The amount watched since the value is tracked is the lower bound of the real amount, so the threshold still holds
+            if amount_watched < min_threshold:
+                continue
+            scores[value] = rating / (amount_watched * RATING_SCALE)
+        return [(x, scores[x]) for x in nlargest(n, scores, key = scores.get)]
+
+    def get_error_bound(self, dimension, liked=False):
+        """Check Aggregates.get_error_bound. For a sketched dimension, it's the lowest tracked total, either of minutes watched or
+        of times watched if liked is True.
+        """
+        if dimension not in self.sketches:
+            return 0
+        return self.sketches[dimension][int(liked)].get_minimum()
+
+def build_range_minimum(values):
+    """Params:
+        values: a list of numbers.
+    Returns a sparse table of the values, so the minimum of any range is found with two lookups: a list of levels, where the i-th
+    number of the level k is the minimum of the 2 ** k values from the i-th one. If the values are already sorted, only the first
+    level is kept, since the minimum of any range is its first value. Check query_range_minimum.
+    """
+    levels = [values]
+    if all(previous <= value for previous, value in zip(values, values[1:])):
+        return levels
+    width = 1
+    while width * 2 <= len(values):
+        level = levels[-1]
+        levels.append([min(level[i], level[i + width]) for i in range(len(level) - width)])
+        width *= 2
+    return levels
+
+def query_range_minimum(levels, low, high):
+    """Params:
+        levels: a list of lists of numbers, as returned by build_range_minimum.
+        low: Int. The position of the first value of the range.
+        high: Int. The position after the last value of the range, which has at least one value.
+    Returns the minimum of the values of the range.
+    """
+    if len(levels) == 1:
+        return levels[0][low]
+    level = (high - low).bit_length() - 1
+    return min(levels[level][low], levels[level][high - (1 << level)])
+
+class TemporalIndex():
+    """Day-bucketed index of the watched content, with the prefix sums of the minutes watched, times watched and ratings of each value
+    of each one of the DIMENSIONS. Any range of dates is answered with two binary searches per value, so the time of a query depends on
+    the amount of values and not on the amount of rows. More rows can be added later, and only the prefix sums of their values are
+    computed again, on the next query.
+    """
+    def __init__(self, watched_content=(), dimensions=None):
+        """Params:
+            watched_content: an iterable of WatchedContent objects. Optional. More can be added later with add.
+            dimensions: an iterable of strings. Optional. The DIMENSIONS that are indexed. By default, all of them.
+        Public attributes:
+            rows: Int. The amount of watched content added.
+        """
+        self.dimensions = tuple(DIMENSIONS if dimensions is None else dimensions)
+        self.rows = 0
+        # For each value, the metrics of each day: [minutes watched, times watched, ratings, position of the first time of the day]
+        self._buckets = dict((dimension, {}) for dimension in self.dimensions)
+        # Position of each value in each row, in the order they are seen
+        self._position = 0
+        # The values with rows added since their prefix sums were computed
+        self._stale = dict((dimension, set()) for dimension in self.dimensions)
+        self._index = dict((dimension, {}) for dimension in self.dimensions if dimension != "day")
+        # Each value of the day dimension is a single day, so they are kept in a sorted list, and a query only goes through its range
+        self._days = [] if "day" in self.dimensions else None
+        for watched in watched_content:
+            self.add(watched)
+
+    def add(self, watched):
+        """Params:
+            watched: WatchedContent object.
+        Returns nothing. Adds the watched content to the buckets of its day.
+        """
+        day = watched.date.toordinal()
+        runtime = watched.content.runtime
+        rating = get_rating_units(watched.rating)
+        for dimension in self.dimensions:
+            values = self._buckets[dimension]
+            stale = self._stale[dimension]
+            for value in DIMENSIONS[dimension](watched):
+                if value not in values:
+                    values[value] = {}
+                days = values[value]
+                self._position += 1
+                if day not in days:
+                    days[day] = [runtime, 1, rating, self._position]
+                else:
+                    days[day][0] += runtime
+                    days[day][1] += 1
+                    days[day][2] += rating
+                stale.add(value)
+        self.rows += 1
+
+    def _update(self):
+        """Private auxiliary method. Computes the prefix sums of the values with rows added since the last query."""
+        for dimension, stale in self._stale.items():
+            if len(stale) == 0:
+                continue
+            if dimension == "day":
+                self._days = sorted((value.toordinal(), value, metrics) for value, day_metrics in self._buckets["day"].items() for metrics in day_metrics.values())
+                stale.clear()
+                continue
+            for value in stale:
+                days = self._buckets[dimension][value]
+                ordered_days = sorted(days)
+                runtime = [0]
+                count = [0]
+                rating = [0]
+                for day in ordered_days:
+                    runtime.append(runtime[-1] + days[day][0])
+                    count.append(count[-1] + days[day][1])
+                    rating.append(rating[-1] + days[day][2])
+                # The first time the value was seen in any range of days, which is the first day of the range unless the file isn't
+                # in chronological order
+                first_positions = build_range_minimum([days[day][3] for day in ordered_days])
+                self._index[dimension][value] = (ordered_days, runtime, count, rating, first_positions)
+            stale.clear()
+
+    def query(self, start=None, end=None):
+        """Params:
+            start: datetime object. Optional. The first day of the range. By default, the first day of the history.
+            end: datetime object. Optional. The last day of the range, which is included. By default, the last day of the history.
+        Returns an Aggregates object with the watched content of the range, so every report can be built from it.
+            The values are ordered by the first time they were seen in the range, so the order and the ties of the reports are the same
+            as if the rows of the range were aggregated, even if the file isn't in chronological order.
+        """
+        self._update()
+        aggregates = Aggregates(dimensions=self.dimensions)
+        for dimension, values in self._index.items():
+            found = []
+            for value, (days, runtime, count, rating, first_positions) in values.items():
+                low = bisect.bisect_left(days, start.toordinal()) if start is not None else 0
+                high = bisect.bisect_right(days, end.toordinal()) if end is not None else len(days)
+                if low < high:
+                    first_position = query_range_minimum(first_positions, low, high)
+                    found.append((first_position, value, runtime[high] - runtime[low], count[high] - count[low], rating[high] - rating[low]))
+            found.sort(key=operator.itemgetter(0))
+            for first_position, value, runtime, count, rating in found:
+                aggregates.runtime[dimension][value] = runtime
+                aggregates.count[dimension][value] = count
+                aggregates.rating[dimension][value] = rating
+        if self._days is not None:
+            low = bisect.bisect_left(self._days, (start.toordinal(),)) if start is not None else 0
+            high = bisect.bisect_left(self._days, (end.toordinal() + 1,)) if end is not None else len(self._days)
+            for ordinal, value, (runtime, count, rating, first_position) in sorted(self._days[low:high], key=lambda day: day[2][3]):
+                aggregates.runtime["day"][value] = runtime
+                aggregates.count["day"][value] = count
+                aggregates.rating["day"][value] = rating
+        return aggregates
+
+class AggregateCube():
+    """Aggregates of the watched content by month and platform. Each cell has the aggregates of every dimension, so the reports of any
+    range of months and set of platforms are built by merging the cells, without going through the rows.
+    """
+    def __init__(self, watched_content=(), dimensions=None):
+        """Params:
+            watched_content: an iterable of WatchedContent objects. Optional. More can be added later with add.
+            dimensions: an iterable of strings. Optional. The DIMENSIONS that are aggregated. By default, all of them.
+        Public attributes:
+            cells: Dictionary. An Aggregates object for each (month, platform) tuple, where the month is a YYYY-MM string.
+            rows: Int. The amount of watched content added.
+        """
+        self.dimensions = tuple(DIMENSIONS if dimensions is None else dimensions)
+        self.cells = {}
+        self.rows = 0
+        # The position of the first row of each value in each cell, so the merged values keep the order of the rows. Otherwise the ties
+        # of the rankings would be broken differently than with a single Aggregates object
+        self._first_positions = {}
+        for watched in watched_content:
+            self.add(watched)
+
+    def add(self, watched):
+        """Params:
+            watched: WatchedContent object.
+        Returns nothing. Adds the watched content to the cell of its month and platform.
+        """
+        key = ("{:04d}-{:02d}".format(watched.date.year, watched.date.month), watched.platform)
+        if key not in self.cells:
+            self.cells[key] = Aggregates(dimensions=self.dimensions)
+            self._first_positions[key] = {dimension: {} for dimension in self.dimensions}
+        self.cells[key].add(watched)
+        first_positions = self._first_positions[key]
+        for dimension in self.dimensions:
+            positions = first_positions[dimension]
+            for value in DIMENSIONS[dimension](watched):
+                if value not in positions:
+                    positions[value] = self.rows
+        self.rows += 1
+
+    def months(self):
+        """Returns a sorted list with the months that have watched content, as YYYY-MM strings."""
+        return sorted(set(month for month, platform in self.cells))
+
+    def platforms(self):
+        """Returns a sorted list with the platforms that have watched content."""
+        return sorted(set(platform for month, platform in self.cells))
+
+    def query(self, start=None, end=None, platforms=None):
+        """Params:
+            start: String. Optional. The first month, as YYYY-MM. By default, the first month of the history.
+            end: String. Optional. The last month, as YYYY-MM, which is included. By default, the last month of the history.
+            platforms: a collection of strings. Optional. The platforms to include. By default, all of them.
+        Returns an Aggregates object with the watched content of the months and platforms. The cells are merged in chronological order.
+        """
+        aggregates = Aggregates(dimensions=self.dimensions)
+        first_positions = {dimension: {} for dimension in self.dimensions}
+        for key in sorted(self.cells):
+            month, platform = key
+            if (start is not None and month < start) or (end is not None and month > end):
+                continue
+            if platforms and platform not in platforms:
+                continue
+            aggregates.merge(self.cells[key])
+            for dimension, positions in self._first_positions[key].items():
+                merged_positions = first_positions[dimension]
+                for value, position in positions.items():
+                    if position < merged_positions.get(value, self.rows):
+                        merged_positions[value] = position
+        # The values are sorted by their first row, as if the rows had been added one by one
+        for dimension, positions in first_positions.items():
+            order = sorted(positions, key=positions.get)
+            for metric in (aggregates.runtime, aggregates.count, aggregates.rating):
+                values = metric[dimension]
+                metric[dimension] = {value: values[value] for value in order}
+        return aggregates
+
+# Dimensions of the columnar store that have many values per row. They are stored as CSR-style offsets and indexes arrays
+COLUMNAR_RELATIONS = {"genre": "genres", "actor": "actors", "director": "directors", "company": "production_companies"}
+
+class Interner():
+    """Assigns an integer ID to each value, in the order they are first seen"""
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def get_id(self, value):
+        """Params:
+            value: Any hashable object.
+        Returns the ID of the value, adding it if it's the first time it's seen.
+        """
+        value_id = self.ids.get(value)
+        if value_id is None:
+            value_id = len(self.values)
+            self.ids[value] = value_id
+            self.values.append(value)
+        return value_id
+
+def factorize(array):
+    """Params:
+        array: a NumPy array.
+    Returns a tuple with the unique values of the array, in the order they are first seen, and the array of codes of each element.
+    """
+    values, first_index, codes = np.unique(array, return_index=True, return_inverse=True)
+    order = np.argsort(first_index, kind="stable")
+    # Renumbering the codes so they follow the order of appearance, as the dictionaries do
+    new_codes = np.empty(len(order), dtype=np.int64)
+    new_codes[order] = np.arange(len(order))
+    return values[order], new_codes[codes.reshape(-1)]
+
+def top_ids(scores, n):
+    """Params:
+        scores: a NumPy array with the score of each ID.
+        n: Int. The amount of IDs to return.
+    Returns an array with the n IDs with the highest score. Ties are broken by the lowest ID, the same way nlargest does with
+    the values that were seen first.
+    """
+    if len(scores) > n:
+        # Only the values that are at least as high as the n-th highest one need to be sorted
+        nth_score = scores[np.argpartition(-scores, n - 1)[:n]].min()
+        candidates = np.nonzero(scores >= nth_score)[0]
+    else:
+        candidates = np.arange(len(scores))
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order][:n]
+
+class ColumnarHistory():
+    """Columnar representation of the watched content, backed by NumPy arrays. It has the same report methods as Aggregates, but
+    they are computed with vectorized operations instead of dictionaries.
+    The people, genres, companies and platforms are interned, so each row only keeps integer IDs.
+    """
+    def __init__(self, watched_content, dimensions=None):
+        """Params:
+            watched_content: an iterable of WatchedContent objects.
+            dimensions: an iterable of strings. Optional. The DIMENSIONS used by the reports. By default, all of them.
+                Only the COLUMNAR_RELATIONS of the given dimensions are built.
+        Public attributes:
+            runtime, rating, date and is_movie: arrays with a value per row. The rating is in RATING_SCALE units. The date is a datetime64 array.
+            platform: array with the code of the platform of each row, as interned in platforms.
+            offsets and indexes: dictionaries with the CSR arrays of each dimension in COLUMNAR_RELATIONS. The values of the row i
+                are indexes[offsets[i]:offsets[i + 1]], which are IDs interned in names.
+        """
+        if np is None:
+            raise ImportError("NumPy is required to use the columnar store")
+        runtime = []
+        rating = []
+        date = []
+        is_movie = []
+        platform = []
+        self.platforms = Interner()
+        self.names = {}
+        offsets = {}
+        indexes = {}
+        relations = dict((dimension, attribute) for dimension, attribute in COLUMNAR_RELATIONS.items() if dimensions is None or dimension in dimensions)
+        for dimension in relations:
+            self.names[dimension] = Interner()
+            offsets[dimension] = [0]
+            indexes[dimension] = []
+        for watched in watched_content:
+            runtime.append(watched.content.runtime)
+            rating.append(get_rating_units(watched.rating))
+            date.append(watched.date.toordinal())
+            is_movie.append(watched.content.is_movie)
+            platform.append(self.platforms.get_id(watched.platform))
+            for dimension, attribute in relations.items():
+                get_id = self.names[dimension].get_id
+                indexes[dimension].extend(get_id(value) for value in getattr(watched.content, attribute))
+                offsets[dimension].append(len(indexes[dimension]))
+        self.runtime = np.array(runtime, dtype=np.int64)
+        self.rating = np.array(rating, dtype=np.int64)
+        # Ordinals start at 0001-01-01 while datetime64 starts at 1970-01-01
+        self.date = (np.array(date, dtype=np.int64) - datetime(1970, 1, 1).toordinal()).astype("datetime64[D]")
+        self.is_movie = np.array(is_movie, dtype=bool)
+        self.platform = np.array(platform, dtype=np.int64)
+        self.offsets = {}
+        self.indexes = {}
+        for dimension in relations:
+            self.offsets[dimension] = np.array(offsets[dimension], dtype=np.int64)
+            self.indexes[dimension] = np.array(indexes[dimension], dtype=np.int64)
+        self._metrics = {}
+
+    def _get_entries(self, dimension):
+        """Private auxiliary method.
+        Params:
+            dimension: String. One of the DIMENSIONS.
+        Returns a tuple with the list of values of the dimension, the array of value codes and the array of the row of each code.
+        """
+        rows = np.arange(len(self.runtime))
+        if dimension in COLUMNAR_RELATIONS:
+            rows = np.repeat(rows, np.diff(self.offsets[dimension]))
+            return self.names[dimension].values, self.indexes[dimension], rows
+        if dimension == "platform":
+            return self.platforms.values, self.platform, rows
+        if dimension == "type":
+            values, codes = factorize(np.where(self.is_movie, "Movie", "Series"))
+        elif dimension == "month":
+            values, codes = factorize(self.date.astype("datetime64[M]").astype(np.int64) % 12 + 1)
+            values = [calendar.month_name[month] for month in values]
+        elif dimension == "weekday":
+            # 1970-01-01 was a Thursday, which is 3 for datetime.weekday
+            values, codes = factorize((self.date.astype(np.int64) + 3) % 7)
+            values = [calendar.day_name[weekday] for weekday in values]
+        elif dimension == "day":
+            values, codes = factorize(self.date)
+            values = [datetime.combine(day, datetime.min.time()) for day in values.tolist()]
+        else:
+            raise KeyError(dimension)
+        return list(values), codes, rows
+
+    def _get_metrics(self, dimension):
+        """Private auxiliary method.
+        Params:
+            dimension: String. One of the DIMENSIONS.
+        Returns a tuple with the list of values of the dimension and the arrays of minutes watched, times watched and sum of ratings of each value.
+        """
+        if dimension not in self._metrics:
+            values, codes, rows = self._get_entries(dimension)
+            runtime = np.bincount(codes, weights=self.runtime[rows], minlength=len(values)).astype(np.int64)
+            count = np.bincount(codes, minlength=len(values))
+            rating = np.bincount(codes, weights=self.rating[rows], minlength=len(values))
+            self._metrics[dimension] = (values, runtime, count, rating)
+        return self._metrics[dimension]
+
+    def totals(self, dimension):
+        """Check Aggregates.totals"""
+        values, runtime, count, rating = self._get_metrics(dimension)
+        return dict(zip(values, runtime.tolist()))
+
+    def counts(self, dimension):
+        """Check Aggregates.counts"""
+        values, runtime, count, rating = self._get_metrics(dimension)
+        return dict(zip(values, count.tolist()))
+
+    def top_watched(self, dimension, n=TOP_N):
+        """Check Aggregates.top_watched"""
+        values, runtime, count, rating = self._get_metrics(dimension)
+        return [(values[i], runtime[i].item()) for i in top_ids(runtime, n)]
+
+    def top_liked(self, dimension, min_threshold=MIN_THRESHOLD, n=TOP_N):
+        """Check Aggregates.top_liked"""
+        values, runtime, count, rating = self._get_metrics(dimension)
+        # The treshold is in place to avoid "one hit wonders" that may get a very high score
+        eligible = np.nonzero(count >= min_threshold)[0]
+        scores = rating[eligible] / (count[eligible] * RATING_SCALE)
+        return [(values[eligible[i]], scores[i].item()) for i in top_ids(scores, n)]
+
+    def get_error_bound(self, dimension, liked=False):
+        """Check Aggregates.get_error_bound"""
+        return 0
+
+def print_ranking(title, ranking):
+    """Params:
+        title: String. The title of the report.
+        ranking: a list of (value, score) tuples.
+    Returns nothing. Prints the report.
+    """
+    print(title)
+    for value, score in ranking:
+        print("{}: {}".format(value, score))
+
+def print_error_bound(aggregates, dimension, liked=False):
+    """Params:
+        aggregates: an Aggregates, SketchAggregates or ColumnarHistory object.
+        dimension: String. One of the DIMENSIONS.
+        liked: Boolean. Whether the report is a best rated one.
+    Returns nothing. Prints how approximate the report is, if it isn't exact.
+    """
+    error_bound = aggregates.get_error_bound(dimension, liked)
+    if error_bound == 0:
+        return
+    if liked:
+        print("(Approximate: only the ratings since a value was among the {} most watched are averaged)".format(aggregates.sketches[dimension][1].capacity))
+    else:
+        print("(Approximate: the minutes can be overestimated by up to {})".format(error_bound))
+
+def get_most_watched_genres(aggregates):
+    """Params: 
+        aggregates: an Aggregates or ColumnarHistory object, built from the list of WatchedContent objects
+    Returns nothing. Prints the most watched genres.
+    """
+    print_ranking("Most watched genres", aggregates.top_watched("genre"))
+
+def get_most_liked_genres(aggregates):
+    """Params: 
+        aggregates: an Aggregates or ColumnarHistory object, built from the list of WatchedContent objects
+    Returns nothing. Prints the most liked genres.
+    """
+    print_ranking("Best rated genres", aggregates.top_liked("genre"))
+
+def get_amount_data(aggregates):
+    """Params:
+        aggregates: an Aggregates or ColumnarHistory object, built from the list of WatchedContent objects
+    Returns a dictionary with the amount of times watched and the minutes watched of the movies and of the series episodes.
+    """
+    counter = aggregates.counts("type")
+    minutes = aggregates.totals("type")
+    return {
+        "movies": {"count": counter.get("Movie", 0), "minutes": minutes.get("Movie", 0)},
+        "series": {"count": counter.get("Series", 0), "minutes": minutes.get("Series", 0)},
+    }
+
+def get_amount_of_movies_and_series_watched(aggregates):
+    """Params: 
+        aggregates: an Aggregates or ColumnarHistory object, built from the list of WatchedContent objects
+    Returns nothing. Prints the amount of movies and series episodes watched.
+    """
+    amount = get_amount_data(aggregates)
+    print("Amount of movies watched: {} ({} minutes)".format(amount["movies"]["count"], amount["movies"]["minutes"]))
+    print("Amount of series watched: {} ({} minutes)".format(amount["series"]["count"], amount["series"]["minutes"]))
+
+def get_platform_usage(aggregates):
+    """Params: 
+        aggregates: an Aggregates or ColumnarHistory object, built from the list of WatchedContent objects
+    Returns nothing. Prints the usage of each platform.
+    """
+    print_ranking("Platform usage", aggregates.totals("platform").items())
+
+def get_most_watched_actors(aggregates):
+    """Params: 
+        aggregates: an Aggregates or ColumnarHistory object, built from the list of WatchedContent objects
+    Returns nothing. Prints the most watched actors.
+    """
+    print_ranking("Most watched actors", aggregates.top_watched("actor"))
+    print_error_bound(aggregates, "actor")
+
+def get_most_liked_actors(aggregates):
+    """Params: 
+        aggregates: an Aggregates or ColumnarHistory object, built from the list of WatchedContent objects
+    Returns nothing. Prints the most liked actors.
+    """
+    print_ranking("Best rated actor", aggregates.top_liked("actor"))
+    print_error_bound(aggregates, "actor", True)
+
+
+def get_most_watched_production_companies(aggregates):
+    """Params: 
+        aggregates: an Aggregates or ColumnarHistory object, built from the list of WatchedContent objects
+    Returns nothing. Prints the most watched production companies.
+    """
+    print_ranking("Most watched production_companies", aggregates.top_watched("company"))
+    print_error_bound(aggregates, "company")
+
+def get_most_liked_production_companies(aggregates):
+    """Params: 
+        aggregates: an Aggregates or ColumnarHistory object, built from the list of WatchedContent objects
+    Returns nothing. Prints the most liked production companies.
+    """
+    print_ranking("Best rated production companies", aggregates.top_liked("company"))
+    print_error_bound(aggregates, "company", True)
+
+
+def get_most_watched_directors(aggregates):
+    """Params: 
+        aggregates: an Aggregates or ColumnarHistory object, built from the list of WatchedContent objects
+    Returns nothing. Prints the most wacthed directors.
+    """
+    print_ranking("Most watched directors", aggregates.top_watched("director"))
+
+def get_most_liked_directors(aggregates):
+    """Params: 
+        aggregates: an Aggregates or ColumnarHistory object, built from the list of WatchedContent objects
+    Returns nothing. Prints the most liked directors.
+    """
+    print_ranking("Best rated director", aggregates.top_liked("director", MIN_THRESHOLD_FOR_DIRECTORS))
+
+def get_activity_data(aggregates):
+    """Params:
+        aggregates: an Aggregates or ColumnarHistory object, built from the list of WatchedContent objects
+    Returns a dictionary with the minutes watched by month and by weekday, and the day with the most activity (None if there's no activity).
+    """
+    months = {"January": 0, "February": 0, "March": 0, "April": 0, "May": 0, "June": 0, "July": 0, "August": 0, "September": 0, "October": 0, "November": 0, "December": 0}
+    weekday = {"Sunday": 0, "Monday": 0, "Tuesday": 0, "Wednesday": 0, "Thursday": 0, "Friday": 0, "Saturday": 0}
+    months.update(aggregates.totals("month"))
+    weekday.update(aggregates.totals("weekday"))
+    days = aggregates.totals("day")
+    # A date range can have no activity at all
+    max_day = None
+    if len(days) > 0:
+        max_day = max(days.items(), key=operator.itemgetter(1))[0]
+    return {"months": months, "weekdays": weekday, "max_day": max_day}
+
+def get_activity_by_month_and_day(aggregates):
+    """Params: 
+        aggregates: an Aggregates or ColumnarHistory object, built from the list of WatchedContent objects
+    Returns nothing. Prints the activity bv mont, the activity by weekday and the day with the most activity.
+    """
+    activity = get_activity_data(aggregates)
+    print("Activity by month")
+    for month, amount in activity["months"].items():
+        print("{}: {}".format(month, amount))
     print()
     print("Activity by weekday")
-    for day, amount in weekday.items():
+    for day, amount in activity["weekdays"].items():
         print("{}: {}".format(day, amount))
     print()
-    max_day = max(days.items(), key=operator.itemgetter(1))[0]
+    max_day = activity["max_day"]
+    if max_day is None:
+        print("Day with the most activity: -")
+        return
     print("Day with the most activity: {}/{}".format(max_day.month, max_day.day))
 
+# Every report, with the function that prints it and the DIMENSIONS it uses, in the order they are printed
+REPORTS = {
+    "genres": (get_most_watched_genres, ("genre",)),
+    "liked_genres": (get_most_liked_genres, ("genre",)),
+    "amount": (get_amount_of_movies_and_series_watched, ("type",)),
+    "platforms": (get_platform_usage, ("platform",)),
+    "actors": (get_most_watched_actors, ("actor",)),
+    "liked_actors": (get_most_liked_actors, ("actor",)),
+    "companies": (get_most_watched_production_companies, ("company",)),
+    "liked_companies": (get_most_liked_production_companies, ("company",)),
+    "directors": (get_most_watched_directors, ("director",)),
+    "liked_directors": (get_most_liked_directors, ("director",)),
+    "activity": (get_activity_by_month_and_day, ("month", "weekday", "day")),
+}
+# The liked reports aren't printed by default
+DEFAULT_REPORTS = ("genres", "amount", "platforms", "actors", "companies", "directors", "activity")
+
+def get_ranking_data(ranking):
+    """Params:
+        ranking: a list of (value, score) tuples.
+    Returns a list of dictionaries with the value and the score, that can be stored as JSON.
+    """
+    return [{"value": value, "score": score} for value, score in ranking]
+
+def get_activity_json_data(aggregates):
+    """Same as get_activity_data, but the day with the most activity is a YYYY-MM-DD string, so it can be stored as JSON."""
+    activity = get_activity_data(aggregates)
+    if activity["max_day"] is not None:
+        activity["max_day"] = activity["max_day"].strftime("%Y-%m-%d")
+    return activity
+
+# Function that returns the data of each one of the REPORTS as a dictionary or list that can be stored as JSON, instead of printing it
+REPORTS_DATA = {
+    "genres": lambda aggregates: get_ranking_data(aggregates.top_watched("genre")),
+    "liked_genres": lambda aggregates: get_ranking_data(aggregates.top_liked("genre")),
+    "amount": get_amount_data,
+    "platforms": lambda aggregates: get_ranking_data(aggregates.totals("platform").items()),
+    "actors": lambda aggregates: get_ranking_data(aggregates.top_watched("actor")),
+    "liked_actors": lambda aggregates: get_ranking_data(aggregates.top_liked("actor")),
+    "companies": lambda aggregates: get_ranking_data(aggregates.top_watched("company")),
+    "liked_companies": lambda aggregates: get_ranking_data(aggregates.top_liked("company")),
+    "directors": lambda aggregates: get_ranking_data(aggregates.top_watched("director")),
+    "liked_directors": lambda aggregates: get_ranking_data(aggregates.top_liked("director", MIN_THRESHOLD_FOR_DIRECTORS)),
+    "activity": get_activity_json_data,
+}
+
+def get_report_dimensions(reports):
+    """Params:
+        reports: an iterable of strings. Check REPORTS.
+    Returns a tuple with the DIMENSIONS used by the given reports.
+    """
+    dimensions = set(dimension for report in reports for dimension in REPORTS[report][1])
+    return tuple(dimension for dimension in DIMENSIONS if dimension in dimensions)
+
+def aggregate_chunk(rows, content_records, dimensions):
+    """Aggregates a chunk of the watched content. It only uses its arguments, so it can be run on another process.
+    Params:
+        rows: a list of (content_index, platform, date, rating) tuples, one for each watched row.
+        content_records: a list with the record of each content used by the rows. Check Content.to_record.
+        dimensions: a tuple of strings. The DIMENSIONS that are aggregated.
+    Returns an Aggregates object.
+    """
+    contents = [Content.from_record(record) for record in content_records]
+    return Aggregates((WatchedContent(contents[index], platform, date, rating) for index, platform, date, rating in rows), dimensions)
+
+def iter_aggregation_chunks(watched_content, chunk_size=AGGREGATION_CHUNK):
+    """Params:
+        watched_content: an iterable of WatchedContent objects.
+        chunk_size: Int. The amount of rows of each chunk.
+    Yields a (rows, content_records) tuple for each chunk of rows, in order, with the arguments of aggregate_chunk. Each chunk only
+    has the records of the content it uses, so the content is sent to the processes once for each chunk instead of once for each row.
+    """
+    watched_content = iter(watched_content)
+    # The record of each content is built once, even if it's used by many chunks
+    records = {}
+    while True:
+        chunk = list(islice(watched_content, chunk_size))
+        if len(chunk) == 0:
+            break
+        indexes = {}
+        content_records = []
+        rows = []
+        for watched in chunk:
+            c = watched.content
+            index = indexes.get(c)
+            if index is None:
+                if c not in records:
+                    records[c] = c.to_record()
+                index = indexes[c] = len(content_records)
+                content_records.append(records[c])
+            rows.append((index, watched.platform, watched.date, watched.rating))
+        yield rows, content_records
+
+def aggregate_in_processes(watched_content, dimensions=None, processes=None, chunk_size=AGGREGATION_CHUNK):
+    """Builds the aggregates of the watched content in chunks, each one on a process of a pool, and merges them in the order of the rows.
+    The rating sums are integers and the values are merged in the order they were first seen, so the result is exactly the same as
+    the one of a single Aggregates object.
+    Params:
+        watched_content: an iterable of WatchedContent objects. It's read as the chunks are aggregated.
+        dimensions: an iterable of strings. Optional. The DIMENSIONS that are aggregated. By default, all of them.
+        processes: Int. Optional. The amount of processes. By default, one for each CPU.
+        chunk_size: Int. The amount of rows aggregated by each process at a time.
+    Returns an Aggregates object.
+    """
+    dimensions = tuple(DIMENSIONS if dimensions is None else dimensions)
+    processes = processes or os.cpu_count() or 1
+    aggregates = Aggregates(dimensions=dimensions)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        # Only a couple of chunks for each process are kept in memory, waiting to be aggregated
+        pending = []
+        for rows, content_records in iter_aggregation_chunks(watched_content, chunk_size):
+            pending.append(executor.submit(aggregate_chunk, rows, content_records, dimensions))
+            if len(pending) >= 2 * processes:
+                aggregates.merge(pending.pop(0).result())
+        for future in pending:
+            aggregates.merge(future.result())
+    return aggregates
+
+def filter_by_date(watched_content, start=None, end=None):
+    """Params:
+        watched_content: an iterable of WatchedContent objects.
+        start: datetime object. Optional. The first day of the range.
+        end: datetime object. Optional. The last day of the range, which is included.
+    Yields the watched content of the range, in the same order.
+    """
+    for watched in watched_content:
+        if (start is None or watched.date >= start) and (end is None or watched.date <= end):
+            yield watched
+
+def build_aggregates(watched_content, columnar=False, dimensions=None, sketch_capacity=None, processes=None):
+    """Params:
+        watched_content: an iterable of WatchedContent objects.
+        columnar: Boolean. Whether to use the NumPy columnar store.
+        dimensions: an iterable of strings. Optional. The DIMENSIONS used by the reports. By default, all of them.
+        sketch_capacity: Int. Optional. If it's provided, the SKETCHED_DIMENSIONS are tracked with sketches of this capacity.
+        processes: Int. Optional. If it's more than 1, the aggregates are built on that amount of processes. Check aggregate_in_processes.
+    Returns either an Aggregates, a SketchAggregates or a ColumnarHistory object.
+    """
+    if columnar:
+        return ColumnarHistory(watched_content, dimensions)
+    if sketch_capacity is not None:
+        return SketchAggregates(watched_content, dimensions, sketch_capacity)
+    if processes is not None and processes > 1:
+        return aggregate_in_processes(watched_content, dimensions, processes)
+    return Aggregates(watched_content, dimensions)
 
-def main():
-    tmdb = APIRequests(API_KEY)
-    watching_habits_raw = load_watching_habits_to_memory_from_csv("Watching habits.tsv")
-    watched_content = []
-    # Building the list of watched content
-    for content in watching_habits_raw:
-        if content["Movie or Series"]== "Movie":
-            c = Movie(tmdb, content["IMDB ID"])
+def print_progress(snapshot, rows, elapsed, file=None):
+    """Params:
+        snapshot: Dictionary. The data of the reports so far, as returned by Aggregates.snapshot.
+        rows: Int. The amount of rows aggregated so far.
+        elapsed: Number. The seconds since the aggregation started.
+        file: a file object. Optional. Where the progress is printed. By default, the standard error, so it isn't mixed with the reports.
+    Returns nothing. Prints the amount of rows and a line for each report, with the first PROGRESS_TOP_N values of the rankings.
+    """
+    file = file or sys.stderr
+    print("[{:.0f}s] {} rows so far".format(elapsed, rows), file=file)
+    for report, data in snapshot.items():
+        if report == "amount":
+            summary = "{} movies, {} episodes".format(data["movies"]["count"], data["series"]["count"])
+        elif report == "activity":
+            summary = "day with the most activity: {}".format(data["max_day"] or "-")
         else:
-            c = SeriesEpisode(tmdb, content["IMDB ID"])
-        if c.tmdb_id == None:
-            print("There's an error with {} ({})".format(content["Name"], content["IMDB ID"]))
+            summary = ", ".join("{} ({})".format(entry["value"], entry["score"]) for entry in data[:PROGRESS_TOP_N])
+        print("  {}: {}".format(report, summary), file=file)
+    file.flush()
+
+def aggregate_with_progress(aggregates, watched_content, interval, reports=DEFAULT_REPORTS, file=None):
+    """Adds the watched content to the aggregates as it's enriched, and prints a snapshot of the reports every interval seconds. The
+    snapshots are printed by another thread, so they keep coming while the rows are being fetched.
+    Params:
+        aggregates: an Aggregates or SketchAggregates object.
+        watched_content: an iterable of WatchedContent objects.
+        interval: Number. The seconds between snapshots.
+        reports: an iterable of strings. The reports included in the snapshots. Check REPORTS.
+        file: a file object. Optional. Check print_progress.
+    Returns the aggregates.
+    """
+    start = time.monotonic()
+    rows = 0
+    # The snapshots aren't taken while a row is being added
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def print_snapshots():
+        while not stop.wait(interval):
+            with lock:
+                snapshot = aggregates.snapshot(reports)
+                snapshot_rows = rows
+            print_progress(snapshot, snapshot_rows, time.monotonic() - start, file)
+
+    printer = threading.Thread(target=print_snapshots, daemon=True)
+    printer.start()
+    try:
+        for watched in watched_content:
+            with lock:
+                aggregates.add(watched)
+                rows += 1
+    finally:
+        stop.set()
+        printer.join()
+    return aggregates
+
+def print_reports(aggregates, reports=DEFAULT_REPORTS, profiler=None):
+    """Params:
+        aggregates: an Aggregates or ColumnarHistory object, built from the list of WatchedContent objects
+        reports: an iterable of strings. The reports that are printed. Check REPORTS.
+        profiler: Profiler object. Optional. If it's provided, each report is timed as a stage.
+    Returns nothing. Prints the reports, in the order of REPORTS.
+    """
+    profiler = profiler or NullProfiler()
+    first = True
+    for report, (print_report, dimensions) in REPORTS.items():
+        if report not in reports:
             continue
-        month, day, year = content["Date"].split("/")
-        watched_content.append(WatchedContent(c, content["Platform"], datetime(int(year), int(month), int(day)), float(content["Rating"])))
+        if not first:
+            print()
+        first = False
+        with profiler.stage("report " + report):
+            print_report(aggregates)
 
-    get_most_watched_genres(watched_content)
-    print()
-    # get_most_liked_genres(watched_content)
-    # print()
-    get_amount_of_movies_and_series_watched(watched_content)
-    print()
-    get_platform_usage(watched_content)
-    print()
-    get_most_watched_actors(watched_content)
-    print()
-    # get_most_liked_actors(watched_content)
-    # print()
-    get_most_watched_production_companies(watched_content)
-    print()
-    # get_most_liked_production_companies(watched_content)
-    # print()
-    get_most_watched_directors(watched_content)
-    print()
-    # get_most_liked_directors(watched_content)
-    # print()
-    get_activity_by_month_and_day(watched_content)
+def load_batch_manifest(path):
+    """Params:
+        path: String. Either a directory, where every .tsv file is the watching habits of a user named after the file,
+            or a manifest file with a line for each user with the user name and the path of its file separated by a tab.
+            The relative paths of the manifest are relative to the manifest itself.
+    Returns a list of (user, file_name) tuples.
+    """
+    if os.path.isdir(path):
+        return [(os.path.splitext(os.path.basename(file_name))[0], file_name) for file_name in sorted(glob.glob(os.path.join(path, "*.tsv")))]
+    users = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            user, file_name = line.split("\t")
+            users.append((user, os.path.join(os.path.dirname(path), file_name)))
+    return users
+
+def write_user_report(rows, content_records, errors, file_name, columnar=False, reports=DEFAULT_REPORTS, sketch_capacity=None):
+    """Builds the reports of a single user. It only uses its arguments, so it can be run on another process.
+    Params:
+        rows: a list of (content_key, platform, date, rating) tuples, one for each watched row. Check get_content_key.
+        content_records: Dictionary. The record of each content used by the rows, by content key. Check Content.to_record.
+        errors: a list of strings, with the errors found while enriching the user's rows.
+        file_name: String. The file where the reports are written.
+        columnar: Boolean. Whether to use the NumPy columnar store.
+        reports: an iterable of strings. The reports that are written. Check REPORTS.
+        sketch_capacity: Int. Optional. Check build_aggregates.
+    Returns the file_name.
+    """
+    contents = {}
+    for key, record in content_records.items():
+        contents[key] = Content.from_record(record)
+    watched_content = (WatchedContent(contents[key], platform, date, rating) for key, platform, date, rating in rows)
+    aggregates = build_aggregates(watched_content, columnar, get_report_dimensions(reports), sketch_capacity)
+    with open(file_name, "w") as f, contextlib.redirect_stdout(f):
+        for error in errors:
+            print(error)
+        print_reports(aggregates, reports)
+    return file_name
+
+def run_batch(requester, path, output_dir=REPORTS_DIR, max_workers=MAX_WORKERS, processes=None, columnar=False, reports=DEFAULT_REPORTS, catalog=None,
+              sketch_capacity=None, dead_letters=None):
+    """Builds the reports of many users. The content of all the users is resolved together, so each title is requested only once
+    no matter how many users watched it. Then the reports of each user are built on a process pool.
+    The rows are enriched as in a single run (check iter_enriched_records): the ones that fail with a transient error are retried, and
+    the ones that keep failing are added to the dead letters and to the errors of the report of their user.
+    Params:
+        requester: APIRequests object.
+        path: String. A directory or a manifest with the files of the users. Check load_batch_manifest.
+        output_dir: String. The directory where the reports are written, in a file for each user.
+        max_workers: Int. The maximum amount of IMDB IDs being resolved at the same time.
+        processes: Int. Optional. The amount of processes building reports. By default, one for each CPU.
+        columnar: Boolean. Whether to use the NumPy columnar store.
+        reports: an iterable of strings. The reports that are written. Check REPORTS.
+        catalog: Catalog object. Optional. If it's provided, the content is taken from it instead of doing requests.
+        sketch_capacity: Int. Optional. Check build_aggregates.
+        dead_letters: DeadLetterQueue object. Optional. Check iter_enriched_records.
+    Returns nothing. Prints where the report of each user was written.
+    """
+    users = load_batch_manifest(path)
+    fields = get_dimension_fields(get_report_dimensions(reports))
+    rows = [[] for user in users]
+    content_records = [{} for user in users]
+    errors = [[] for user in users]
+    # The position of the user of each record being enriched, by the identity of the record, since different users can have the same
+    # row. A record is left out as soon as it's yielded or failed, so the identities are never reused while they are here
+    record_users = {}
+
+    def iter_records():
+        for position, (user, file_name) in enumerate(users):
+            for record in iter_watching_habits(file_name):
+                record_users[id(record)] = position
+                yield record
+
+    def report_error(record, message):
+        errors[record_users.pop(id(record))].append(message)
+
+    # The metadata of all the users is shared, so the requests depend on the unique titles and not on the amount of users
+    for record, c in iter_enriched_records(requester, iter_records(), max_workers, fields=fields, catalog=catalog, dead_letters=dead_letters,
+                                           report_error=report_error):
+        position = record_users.pop(id(record))
+        key = get_content_key(record)
+        if key not in content_records[position]:
+            content_records[position][key] = c.to_record()
+        rows[position].append((key, record.platform, record.date, record.rating))
+    os.makedirs(output_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = []
+        for position, (user, file_name) in enumerate(users):
+            futures.append(executor.submit(write_user_report, rows[position], content_records[position], errors[position], os.path.join(output_dir, user + ".txt"),
+                                           columnar, reports, sketch_capacity))
+        with requester.profiler.stage("reports"):
+            for (user, file_name), future in zip(users, futures):
+                print("Report of {} written to {}".format(user, future.result()))
+
+class HistoryTail():
+    """Reads the rows added to the end of a watching habits file since the last read, so a file that keeps growing isn't read again
+    from the start. Only the complete rows are read, and a row that's still being written is read once its line break is written.
+    The rows that can't be parsed are printed and skipped, so a malformed row doesn't stop the rows after it.
+    """
+    def __init__(self, file_name):
+        """Params:
+            file_name: String. The watching habits file. Check iter_watching_habits.
+        """
+        self.file_name = file_name
+        self._offset = 0
+        self._inode = None
+        self._header = None
+        # True while the whole file is being read. If it isn't read to the end, i.e. because of an error, it's read again on the next read
+        self._loading = False
+
+    def read(self):
+        """Returns a tuple with an iterable of WatchRecord objects, with the rows added since the last read, and a boolean that is True if the
+        file was truncated or replaced since the last read. In that case, and on the first read, the rows are all the rows of the file,
+        which are read as they are iterated, as iter_watching_habits does, so the file is never fully loaded in memory. They have to be
+        iterated before the next read.
+        """
+        with open(self.file_name, "rb") as f:
+            status = os.fstat(f.fileno())
+            reset = self._loading or (self._inode is not None and (status.st_ino != self._inode or status.st_size < self._offset))
+            if self._inode is None or reset:
+                self._loading = True
+                return self._load(), reset
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        header = [self._header] if self._header is not None else []
+        lines = header + list(self._decode(data[:end].splitlines(True)))
+        return list(parse_watching_habits(lines, self._report_error)), False
+
+    def _load(self):
+        """Private auxiliary method. Yields a WatchRecord object for each row of the whole file, as it's read. The whole file is read,
+        even if the last row doesn't end with a line break.
+        """
+        with open(self.file_name, "rb") as f:
+            self._inode = os.fstat(f.fileno()).st_ino
+            self._offset = 0
+            self._header = None
+            for record in parse_watching_habits(self._decode(f), self._report_error):
+                yield record
+        self._loading = False
+
+    def _decode(self, lines):
+        """Private auxiliary method. Yields each line of bytes as a string, adding its length to the offset of the next read. The first
+        line of the file is kept as its header, for the rows added after it.
+        """
+        for line in lines:
+            self._offset += len(line)
+            line = line.decode("utf-8")
+            if self._header is None:
+                self._header = line
+            yield line
+
+    def _report_error(self, line, error):
+        """Private auxiliary method. Prints the row that couldn't be parsed."""
+        print("A row of {} couldn't be read, so it's skipped: {} ({!r})".format(self.file_name, json.dumps(line), error), flush=True)
+
+def parse_month(value):
+    """Params:
+        value: String. A month in the YYYY-MM format.
+    Returns the month as a YYYY-MM string, with the leading zeros. Raises ValueError if it isn't a month.
+    """
+    try:
+        return datetime.strptime(value, "%Y-%m").strftime("%Y-%m")
+    except ValueError:
+        raise ValueError("{} isn't a YYYY-MM month".format(value))
+
+def parse_period(value):
+    """Params:
+        value: String. A month in the YYYY-MM format or a day in the YYYY-MM-DD format.
+    Returns the month as a YYYY-MM string or the day as a datetime object. Raises ValueError if it's neither of them.
+    """
+    try:
+        return parse_month(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError("{} isn't a YYYY-MM month or a YYYY-MM-DD day".format(value))
+
+class ReportsService():
+    """Keeps the enriched history in memory as an AggregateCube and a TemporalIndex, so the reports of any range of months and platforms,
+    or of any range of days, are answered without reading the file or doing requests again. The rows added to the file are enriched and
+    added to both with update.
+    """
+    def __init__(self, requester, file_name, max_workers=MAX_WORKERS, journal=None, catalog=None):
+        """Params:
+            requester: APIRequests object.
+            file_name: String. The watching habits file.
+            max_workers: Int. The maximum amount of IMDB IDs being resolved at the same time.
+            journal: Journal object. Optional. It's only used to load the file the first time, since the journal is closed after that.
+            catalog: Catalog object. Optional. If it's provided, the content is taken from it instead of doing requests.
+        Public attributes:
+            cube: AggregateCube object, with every dimension used by the REPORTS.
+            index: TemporalIndex object, with the same rows and dimensions as the cube.
+        """
+        self.requester = requester
+        self.max_workers = max_workers
+        self.catalog = catalog
+        self.dimensions = get_report_dimensions(REPORTS)
+        self.fields = get_dimension_fields(self.dimensions)
+        self._tail = HistoryTail(file_name)
+        # The cube and the index are updated by the thread that polls the file while the queries are answered by other threads. The
+        # queries also take the lock, since the index computes the prefix sums of the new rows on the first query after them
+        self._lock = threading.Lock()
+        records, reset = self._tail.read()
+        self.cube, self.index = self._build(enrich_watch_records(requester, records, max_workers, journal=journal, fields=self.fields, catalog=catalog))
+
+    def _build(self, watched_content):
+        """Private auxiliary method. Returns a tuple with an AggregateCube and a TemporalIndex object with the watched content."""
+        cube = AggregateCube(dimensions=self.dimensions)
+        index = TemporalIndex(dimensions=self.dimensions)
+        for watched in watched_content:
+            cube.add(watched)
+            index.add(watched)
+        return cube, index
+
+    def update(self):
+        """Returns the amount of rows added. Enriches the rows added to the file since the last update and adds them to the cube and the index.
+        If the file was truncated or replaced, they are built again from the whole file.
+        """
+        records, reset = self._tail.read()
+        # The rows are enriched before taking the lock, so the queries aren't blocked by the requests
+        watched_content = enrich_watch_records(self.requester, records, self.max_workers, fields=self.fields, catalog=self.catalog)
+        if reset:
+            cube, index = self._build(watched_content)
+            with self._lock:
+                self.cube, self.index = cube, index
+            return cube.rows
+        if len(records) == 0:
+            return 0
+        watched_content = list(watched_content)
+        with self._lock:
+            for watched in watched_content:
+                self.cube.add(watched)
+                self.index.add(watched)
+        return len(records)
+
+    def describe(self):
+        """Returns a dictionary with the names of the reports, the amount of rows, and the months and platforms with watched content."""
+        with self._lock:
+            return {"reports": list(REPORTS), "rows": self.cube.rows, "months": self.cube.months(), "platforms": self.cube.platforms()}
+
+    def query(self, report, start=None, end=None, platforms=None):
+        """Params:
+            report: String. One of the REPORTS.
+            start, end: YYYY-MM strings or datetime objects. Optional. The first and last months (check AggregateCube.query) or days
+                (check TemporalIndex.query) of the range, which are included. A month along with a day is taken as its first or last day.
+            platforms: check AggregateCube.query. They can only be used with months.
+        Returns a dictionary with the report, the filters and the data of the report. Check REPORTS_DATA.
+        Raises ValueError if the platforms are used with days.
+        """
+        if isinstance(start, datetime) or isinstance(end, datetime):
+            if platforms:
+                raise ValueError("The platforms can only be used with months, not with days")
+            if start is not None and not isinstance(start, datetime):
+                start = datetime.strptime(start, "%Y-%m")
+            if end is not None and not isinstance(end, datetime):
+                end = datetime.strptime(end, "%Y-%m")
+                end = end.replace(day=calendar.monthrange(end.year, end.month)[1])
+            with self._lock:
+                aggregates = self.index.query(start, end)
+            start = start.strftime("%Y-%m-%d") if start is not None else None
+            end = end.strftime("%Y-%m-%d") if end is not None else None
+        else:
+            with self._lock:
+                aggregates = self.cube.query(start, end, platforms)
+        return {"report": report, "start": start, "end": end, "platforms": platforms, "data": REPORTS_DATA[report](aggregates)}
+
+class ReportsRequestHandler(BaseHTTPRequestHandler):
+    """HTTP API of the ReportsService in the service attribute of the server. Every response is JSON:
+        GET /reports: the names of the reports, the amount of rows, and the months and platforms with watched content.
+        GET /reports/<report>?start=YYYY-MM&end=YYYY-MM&platform=<platform>: the data of a report. The parameters are optional,
+            the months are included and the platform can be repeated. The range can also be of days (YYYY-MM-DD), without platforms.
+    """
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        if parts == ["reports"]:
+            self._send_json(200, self.server.service.describe())
+            return
+        if len(parts) != 2 or parts[0] != "reports" or parts[1] not in REPORTS_DATA:
+            self._send_json(404, {"error": "{} isn't a report".format(url.path)})
+            return
+        params = parse_qs(url.query)
+        try:
+            start = parse_period(params["start"][-1]) if "start" in params else None
+            end = parse_period(params["end"][-1]) if "end" in params else None
+            data = self.server.service.query(parts[1], start, end, params.get("platform"))
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        self._send_json(200, data)
+
+    def _send_json(self, status, data):
+        """Private auxiliary method. Sends the data as the JSON body of the response."""
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # The queries aren't logged, so the output only has the updates of the history
+        pass
+
+def serve_reports(requester, file_name, host="127.0.0.1", port=SERVE_PORT, max_workers=MAX_WORKERS, journal=None, catalog=None, poll=SERVE_POLL_SECONDS):
+    """Loads the history once and answers the queries of the reports over HTTP until it's interrupted. Check ReportsRequestHandler.
+    Params:
+        requester: APIRequests object.
+        file_name: String. The watching habits file. The rows added to it are added to the reports every poll seconds.
+        host: String. The address the server listens to.
+        port: Int. The port the server listens to. If it's 0, any free port is used.
+        max_workers, journal and catalog: check ReportsService.
+        poll: Number. The seconds between checks for new rows.
+    Returns nothing.
+    """
+    service = ReportsService(requester, file_name, max_workers, journal, catalog)
+    server = ThreadingHTTPServer((host, port), ReportsRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    stop = threading.Event()
+
+    def poll_history():
+        while not stop.wait(poll):
+            try:
+                added = service.update()
+            except OSError as e:
+                # The file can be missing for a moment while it's saved by an editor
+                print("The file couldn't be read: {}".format(e), flush=True)
+                continue
+            except Exception as e:
+                # Any other error is reported and retried on the next poll, since the thread isn't started again
+                print("The new rows couldn't be added: {!r}".format(e), flush=True)
+                continue
+            if added > 0:
+                print("{} rows read, {} rows in total".format(added, service.cube.rows), flush=True)
+
+    poller = threading.Thread(target=poll_history, daemon=True)
+    poller.start()
+    print("Serving the reports of {} rows on http://{}:{}/reports".format(service.cube.rows, server.server_address[0], server.server_address[1]), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+
+def parse_iso_date(value):
+    """Params:
+        value: String. A date in the YYYY-MM-DD format.
+    Returns a datetime object.
+    """
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError("{} isn't a YYYY-MM-DD date".format(value))
+
+def positive_float(value):
+    """Params:
+        value: String. A number greater than 0.
+    Returns a float.
+    """
+    try:
+        number = float(value)
+    except ValueError:
+        number = 0
+    if not number > 0:
+        raise argparse.ArgumentTypeError("{} isn't a number greater than 0".format(value))
+    return number
+
+def positive_int(value):
+    """Params:
+        value: String. An integer greater than 0.
+    Returns an int.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if not number > 0:
+        raise argparse.ArgumentTypeError("{} isn't an integer greater than 0".format(value))
+    return number
+
+def parse_arguments(argv=None):
+    """Params:
+        argv: list of strings. Optional. The command line arguments, without the program name. By default, sys.argv is used.
+    Returns the parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Year in review of your movies and series watching habits")
+    parser.add_argument("file", nargs="?", default=WATCHING_HABITS_FILE, help="TSV file with the watching habits (default: %(default)s)")
+    parser.add_argument("--workers", type=positive_int, default=MAX_WORKERS, help="Amount of rows enriched at the same time (default: %(default)s)")
+    parser.add_argument("--plan", action="store_true", help="Only print the amount of requests needed to enrich the file, without doing them")
+    parser.add_argument("--columnar", action="store_true", help="Compute the reports with the NumPy columnar store")
+    parser.add_argument("--sketch-capacity", type=positive_int, metavar="N",
+                        help="Track the actors and companies with fixed size sketches of N values, for bounded memory on huge histories")
+    parser.add_argument("--start", type=parse_iso_date, help="Only report the content watched from this date on (YYYY-MM-DD)")
+    parser.add_argument("--end", type=parse_iso_date, help="Only report the content watched until this date, included (YYYY-MM-DD)")
+    parser.add_argument("--journal", default=JOURNAL_FILE, help="Journal of the enriched rows, so only new rows are enriched (default: %(default)s)")
+    parser.add_argument("--no-journal", dest="journal", action="store_const", const=None, help="Enrich every row, without using the journal")
+    parser.add_argument("--dead-letters", default=DEAD_LETTER_FILE, help="File where the rows that couldn't be enriched are kept (default: %(default)s)")
+    parser.add_argument("--retry-dead-letters", action="store_true",
+                        help="Only retry the rows of the --dead-letters file, so their info is cached for the next run")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Remove the cached info of the movies and shows that changed in TMDB since the last refresh, and nothing else")
+    parser.add_argument("--batch", metavar="PATH", help="Build the reports of many users, from a directory of TSV files or a manifest")
+    parser.add_argument("--reports-dir", default=REPORTS_DIR, help="Directory where the --batch reports are written (default: %(default)s)")
+    parser.add_argument("--processes", type=int,
+                        help="Amount of processes building the reports (default: one for each CPU with --batch, a single one otherwise)")
+    parser.add_argument("--base-url", default=os.environ.get(BASE_URL_VARIABLE, BASE_URL),
+                        help="URL of the TMDB API, i.e. a local stand-in to benchmark the script (default: ${} or %(default)s)".format(BASE_URL_VARIABLE))
+    parser.add_argument("--build-catalog", metavar="CATALOG", help="Write the info of every title of the file (or of the --batch files) to an offline catalog")
+    parser.add_argument("--catalog", help="Build the reports offline, with the info of an offline catalog instead of the API")
+    parser.add_argument("--serve", type=int, nargs="?", const=SERVE_PORT, metavar="PORT",
+                        help="Keep the history in memory and answer the queries of the reports as JSON over HTTP (default port: %(const)s)")
+    parser.add_argument("--host", default="127.0.0.1", help="Address that --serve listens to (default: %(default)s)")
+    parser.add_argument("--poll", type=float, default=SERVE_POLL_SECONDS, help="Seconds between checks for new rows while serving (default: %(default)s)")
+    parser.add_argument("--season-cast", action="store_true",
+                        help="Take the episodes from the details of their season, with a request for each season instead of each episode. "
+                             "The actors of an episode are then the cast of its season, an approximation without its guest stars")
+    parser.add_argument("--progress", type=positive_float, metavar="SECONDS",
+                        help="Print a snapshot of the reports to the standard error every SECONDS, while the file is enriched")
+    parser.add_argument("--profile", metavar="FILE", help="Write a JSON profile of the run, with the requests by endpoint and the time of each stage")
+    parser.add_argument("--reports", type=lambda value: value.split(","), default=DEFAULT_REPORTS,
+                        help="Comma separated reports to print, out of: {} (default: {})".format(", ".join(REPORTS), ",".join(DEFAULT_REPORTS)))
+    args = parser.parse_args(argv)
+    unknown = [report for report in args.reports if report not in REPORTS]
+    if unknown:
+        parser.error("unknown reports: {}".format(", ".join(unknown)))
+    if args.sketch_capacity is not None and args.columnar:
+        parser.error("--sketch-capacity can't be used with --columnar")
+    if args.processes is not None and args.processes > 1 and not args.batch and (args.columnar or args.sketch_capacity is not None):
+        parser.error("--processes can't be used with --columnar or --sketch-capacity")
+    if args.progress is not None and (args.batch or args.plan or args.build_catalog or args.serve is not None or args.columnar
+                                      or (args.processes is not None and args.processes > 1)):
+        parser.error("--progress can't be used with --batch, --plan, --build-catalog, --serve, --columnar or --processes")
+    if args.refresh and (args.batch or args.plan or args.build_catalog or args.serve is not None or args.retry_dead_letters):
+        parser.error("--refresh can't be used with --batch, --plan, --build-catalog, --serve or --retry-dead-letters")
+    if args.retry_dead_letters and (args.batch or args.plan or args.build_catalog or args.serve is not None):
+        parser.error("--retry-dead-letters can't be used with --batch, --plan, --build-catalog or --serve")
+    if args.serve is not None and (args.batch or args.plan or args.build_catalog or args.columnar or args.sketch_capacity is not None or args.start or args.end):
+        parser.error("--serve can't be used with --batch, --plan, --build-catalog, --columnar, --sketch-capacity, --start or --end")
+    return args
+
+def run(tmdb, args):
+    """Params:
+        tmdb: APIRequests object.
+        args: the parsed arguments. Check parse_arguments.
+    Returns nothing. Prints the reports, the fetch plan or where the batch reports were written, depending on the arguments.
+    """
+    profiler = tmdb.profiler
+    if args.refresh:
+        # The journal keeps the content of the rows it has, so the changed content is also removed from it
+        journal = Journal(args.journal) if args.journal and os.path.exists(args.journal) else None
+        with profiler.stage("refresh"):
+            changed, removed, discarded = refresh_cache(tmdb, journal)
+        print("Changed in TMDB since the last refresh: {} movies and {} shows".format(changed["movie"], changed["tv"]))
+        print("{} cached responses and {} journal entries were removed".format(removed, discarded))
+        return
+    if args.build_catalog:
+        if args.batch:
+            records = (record for user, file_name in load_batch_manifest(args.batch) for record in iter_watching_habits(file_name))
+        else:
+            records = iter_watching_habits(args.file)
+        with profiler.stage("catalog"):
+            amount = build_catalog(tmdb, records, args.build_catalog, args.workers)
+        print("{} titles written to the catalog {}".format(amount, args.build_catalog))
+        return
+    # In the offline mode, no request is done and every title has to be in the catalog
+    catalog = Catalog(args.catalog) if args.catalog else None
+    if args.batch:
+        run_batch(tmdb, args.batch, args.reports_dir, args.workers, args.processes, args.columnar, args.reports, catalog, args.sketch_capacity,
+                  DeadLetterQueue(args.dead_letters))
+        return
+    # Only the info used by the selected reports is requested
+    dimensions = get_report_dimensions(args.reports)
+    fields = get_dimension_fields(dimensions)
+    if args.retry_dead_letters:
+        dead_letters = DeadLetterQueue(args.dead_letters)
+        records = dead_letters.records()
+        # The journal isn't used, since it would take the rows of the file that aren't in the queue as removed
+        enriched = sum(1 for watched in enrich_watch_records(tmdb, records, args.workers, fields=fields, catalog=catalog, dead_letters=dead_letters))
+        print("{} of the {} rows of the dead letters were enriched".format(enriched, len(records)))
+        return
+    records = iter_watching_habits(args.file)
+    if args.plan:
+        with profiler.stage("plan"):
+            print_fetch_plan(FetchPlan(tmdb, records, fields=fields))
+        return
+    journal = None
+    if args.journal:
+        journal = Journal(args.journal, tmdb if catalog is None else None)
+    if args.serve is not None:
+        serve_reports(tmdb, args.file, args.host, args.serve, args.workers, journal, catalog, args.poll)
+        return
+    # The watched content is aggregated as it's enriched, so the whole history is never kept in memory
+    window = PROGRESS_WINDOW if args.progress is not None else STREAM_WINDOW
+    watched_content = enrich_watch_records(tmdb, records, args.workers, window, journal, fields, catalog, DeadLetterQueue(args.dead_letters))
+    # All the reports are built from the same aggregates, computed in a single pass. The reading and the requests are nested stages
+    if args.start or args.end:
+        # A single period is aggregated while the rows are read. Indexing them is only worth it for many periods, check ReportsService
+        watched_content = filter_by_date(watched_content, args.start, args.end)
+    with profiler.stage("aggregation"):
+        if args.progress is not None:
+            aggregates = aggregate_with_progress(build_aggregates((), dimensions=dimensions, sketch_capacity=args.sketch_capacity), watched_content,
+                                                 args.progress, args.reports)
+        else:
+            aggregates = build_aggregates(watched_content, args.columnar, dimensions, args.sketch_capacity, args.processes)
+    with profiler.stage("reports"):
+        print_reports(aggregates, args.reports, profiler)
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    profiler = Profiler() if args.profile else None
+    # The responses are cached between runs, so running the script again on the same file doesn't need any request
+    tmdb = APIRequests(API_KEY, ResponseCache(CACHE_FILE), args.base_url, profiler=profiler, season_cast=args.season_cast, max_workers=args.workers)
+    try:
+        run(tmdb, args)
+    finally:
+        # The profile is also written if the run fails, since that's when it's most useful
+        if profiler is not None:
+            profiler.write(args.profile)
 
-main()
+if __name__ == "__main__":
+    main()